@@ -0,0 +1,56 @@
+import bpy
+import bmesh
+from functools import partial
+import numpy as np
+import os
+import time
+from mathutils import Vector
+
+
+def benchmark(fn, repeats = 5):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def remove_mesh(obj):
+    mesh = obj.data
+    bpy.data.objects.remove(obj, do_unlink = True)
+    bpy.data.meshes.remove(mesh, do_unlink = True)
+
+
+def bmesh_import_color(bm, **kwargs):
+    import_color(bm, domain = "CORNER", **kwargs)
+    obj = add_mesh(bm)
+    remove_mesh(obj)
+    bm.loops.layers.color.remove(bm.loops.layers.color.active)
+
+
+def foreach_set_import_color(bm, domain = "CORNER", **kwargs):
+    obj = add_mesh(bm)
+    import_color(obj, domain = domain, **kwargs)
+    remove_mesh(obj)
+
+
+
+
+directory = os.getcwd()
+with open(os.path.join(directory,"render.py")) as file:
+    exec(file.read())
+
+reset_scene()
+
+
+for (mesh_file, data_file) in [("s2.obj","s2_ker.csv"), ("dr.obj","dr_ker.csv")]:
+    bm = import_bmesh(os.path.join(directory, "mgp", mesh_file))
+    kwargs = dict(data_file = os.path.join(directory, "mgp", data_file), palette_file = os.path.join(directory, "col", "viridis.csv"))
+    load_csv(kwargs["data_file"])
+    bmesh_time = benchmark(partial(bmesh_import_color, bm, **kwargs))
+    foreach_set_time = benchmark(partial(foreach_set_import_color, bm, **kwargs))
+    point_time = benchmark(partial(foreach_set_import_color, bm, domain = "POINT", **kwargs))
+    print("import_color %s (%i verts, %i loops): bmesh %.3fs, foreach_set %.3fs, point attribute %.3fs, speedup %.1fx" % (
+        mesh_file, len(bm.verts), sum(len(face.loops) for face in bm.faces), bmesh_time, foreach_set_time, point_time, bmesh_time / min(foreach_set_time, point_time)))
+    bm.free()
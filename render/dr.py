@@ -1,19 +1,34 @@
 import bpy
 import bmesh
 from functools import partial
+from itertools import product
 import numpy as np
 import os
 from mathutils import Vector
+from mathutils.bvhtree import BVHTree
 
 
-def create_voxel_remesh(bm):
+def create_voxel_remesh(bm, voxel_size = 0.0005):
     mesh = bpy.data.meshes.new("Mesh")
+    bm.to_mesh(mesh)
+    remesh_file = cache_path("remesh", array_hash(*mesh_arrays(mesh), np.float64(voxel_size)) + ".npz")
+    
+    if os.path.exists(remesh_file):
+        bpy.data.meshes.remove(mesh, do_unlink = True)
+        with np.load(remesh_file) as file:
+            mesh = mesh_from_arrays("Mesh", file["co"], file["loop_totals"], file["loop_vertices"])
+        
+        vox_bm = bmesh.new()
+        vox_bm.from_mesh(mesh)
+        bpy.data.meshes.remove(mesh, do_unlink = True)
+        
+        return vox_bm
+    
     obj = bpy.data.objects.new("Mesh", mesh)
     bpy.context.collection.objects.link(obj)
-    bm.to_mesh(mesh)
     
     obj.data.remesh_mode = "VOXEL"
-    obj.data.remesh_voxel_size = 0.0005
+    obj.data.remesh_voxel_size = voxel_size
     
     bpy.ops.object.select_all(action = "DESELECT")
     obj.select_set(True)
@@ -23,62 +38,163 @@ def create_voxel_remesh(bm):
     vox_bm = bmesh.new()
     vox_bm.from_mesh(mesh)
     
+    (co, loop_totals, loop_vertices) = mesh_arrays(mesh)
+    temp_file = "%s.%i.npz" % (remesh_file[:-4], os.getpid())
+    np.savez(temp_file, co = co, loop_totals = loop_totals, loop_vertices = loop_vertices)
+    os.replace(temp_file, remesh_file)
+    
     bpy.data.objects.remove(obj, do_unlink = True)
     bpy.data.meshes.remove(mesh, do_unlink = True)
     
     return vox_bm
 
 
-def transfer_vertex_colors_to_voxel_remesh(obj, bm):
-    temp_mesh = bpy.data.meshes.new("Temp")
-    temp_obj = bpy.data.objects.new("Temp", temp_mesh)
-    bpy.context.collection.objects.link(temp_obj)
-    bm.to_mesh(temp_mesh)
+color_transfer_cache = {}
+
+
+def mesh_triangles(mesh):
+    mesh.calc_loop_triangles()
+    triangles = np.empty(len(mesh.loop_triangles) * 3, dtype=np.int32)
+    mesh.loop_triangles.foreach_get("vertices", triangles)
+    return triangles.reshape(-1,3)
+
+
+def barycentric_weights(corners, points):
+    edge_1 = corners[:,1] - corners[:,0]
+    edge_2 = corners[:,2] - corners[:,0]
+    offset = points - corners[:,0]
+    d11 = np.sum(edge_1 * edge_1, axis=-1)
+    d12 = np.sum(edge_1 * edge_2, axis=-1)
+    d22 = np.sum(edge_2 * edge_2, axis=-1)
+    d01 = np.sum(offset * edge_1, axis=-1)
+    d02 = np.sum(offset * edge_2, axis=-1)
+    denominator = d11 * d22 - d12 * d12
+    degenerate = denominator == 0
+    denominator = np.where(degenerate, 1, denominator)
     
-    bpy.ops.object.select_all(action = "DESELECT")
-    temp_obj.select_set(True)
-    obj.select_set(True)
-    bpy.context.view_layer.objects.active = temp_obj
-    bpy.ops.object.data_transfer(data_type = "VCOL")
+    v = np.where(degenerate, 0, (d22 * d01 - d12 * d02) / denominator)
+    w = np.where(degenerate, 0, (d11 * d02 - d12 * d01) / denominator)
+    weights = np.clip(np.stack((1 - v - w, v, w), axis=-1), 0, 1)
     
-    bpy.data.objects.remove(temp_obj, do_unlink = True)
-    bpy.data.meshes.remove(temp_mesh, do_unlink = True)
+    return weights / weights.sum(axis=-1, keepdims=True)
 
 
-def subdivide_near_data_points(obj, points_file, radius=0.003):
-    points = np.genfromtxt(points_file, delimiter=",", dtype=int)
+def compute_color_transfer_map(bm, mesh):
+    source_mesh = bpy.data.meshes.new("Temp")
+    bm.to_mesh(source_mesh)
+    (source_co, _, _) = mesh_arrays(source_mesh)
+    source_triangles = mesh_triangles(source_mesh)
+    bpy.data.meshes.remove(source_mesh, do_unlink = True)
+    (target_co, target_loop_totals, target_loop_vertices) = mesh_arrays(mesh)
+    
+    key = array_hash(source_co, source_triangles, target_co, target_loop_totals, target_loop_vertices)
+    if key in color_transfer_cache:
+        return color_transfer_cache[key]
+    
+    map_file = cache_path("transfer", key + ".npz")
+    if os.path.exists(map_file):
+        with np.load(map_file) as file:
+            transfer_map = (file["indices"], file["weights"])
+    else:
+        tree = BVHTree.FromPolygons(source_co.tolist(), source_triangles.tolist(), all_triangles = True)
+        nearest_triangles = np.empty(len(target_co), dtype=np.int64)
+        nearest_locations = np.empty((len(target_co),3))
+        for (idx,co) in enumerate(target_co):
+            (location, normal, triangle, distance) = tree.find_nearest(co)
+            nearest_triangles[idx] = triangle
+            nearest_locations[idx] = location
+        
+        indices = source_triangles[nearest_triangles]
+        weights = barycentric_weights(source_co[indices].astype(np.float64), nearest_locations).astype(np.float32)
+        transfer_map = (indices, weights)
+        
+        temp_file = "%s.%i.npz" % (map_file[:-4], os.getpid())
+        np.savez(temp_file, indices = indices, weights = weights)
+        os.replace(temp_file, map_file)
+    
+    color_transfer_cache[key] = transfer_map
+    
+    return transfer_map
+
+
+def transfer_vertex_colors_to_voxel_remesh(obj, bm, colors):
+    (indices, weights) = compute_color_transfer_map(bm, obj.data)
+    remesh_colors = np.einsum("ij,ijk->ik", weights, colors[indices])
+    set_vertex_colors(obj, remesh_colors)
+
+
+data_point_index_cache = {}
+
+
+def grid_cell_keys(cells):
+    cells = cells + (1 << 20)
+    return (cells[...,0] << 42) | (cells[...,1] << 21) | cells[...,2]
+
+
+def build_data_point_index(bm, points_file, radius):
+    key = (os.path.abspath(points_file), radius)
+    if key not in data_point_index_cache:
+        bm.verts.ensure_lookup_table()
+        locations = np.array([bm.verts[i].co for i in load_csv(points_file, dtype=int)])
+        cells = np.floor(locations / radius).astype(np.int64)
+        data_point_index_cache[key] = {"locations": locations, "radius": radius, "keys": np.unique(grid_cell_keys(cells))}
+    
+    return data_point_index_cache[key]
+
+
+def query_data_point_index(index, mesh):
+    co = np.empty(len(mesh.vertices) * 3, dtype=np.float32)
+    mesh.vertices.foreach_get("co", co)
+    co = co.reshape(-1,3)
+    
+    cells = np.floor(co / index["radius"]).astype(np.int64)
+    candidate = np.zeros(len(co), dtype=bool)
+    for offset in product((-1,0,1), repeat = 3):
+        candidate |= np.isin(grid_cell_keys(cells + offset), index["keys"])
+    
+    candidates = np.flatnonzero(candidate)
+    distances = np.linalg.norm(co[candidates,np.newaxis,:] - index["locations"][np.newaxis,:,:], axis=-1)
+    near = np.zeros(len(co), dtype=bool)
+    near[candidates[np.any(distances < index["radius"], axis=-1)]] = True
+    
+    return near
+
+
+def subdivide_near_data_points(obj, bm, points_file, radius=0.003):
     mesh = obj.data
     
     bpy.ops.object.select_all(action = "DESELECT")
     obj.select_set(True)
     bpy.context.view_layer.objects.active = obj
     
-    bm.verts.ensure_lookup_table()
-    for poly in mesh.polygons:
-        for loop_idx in poly.loop_indices:
-            loop = mesh.loops[loop_idx]
-            vert = mesh.vertices[loop.vertex_index]
-            for i in points:
-                if (vert.co - bm.verts[i].co).length < radius:
-                    vert.select = True
+    near = query_data_point_index(build_data_point_index(bm, points_file, radius), mesh)
+    mesh.vertices.foreach_set("select", near)
     
     bpy.ops.object.mode_set(mode="EDIT")
     bpy.ops.mesh.subdivide(number_cuts = 2)
     bpy.ops.object.editmode_toggle()
     
 
-def import_data_points_color(obj, bm, points_file, radius = 0.002, color = (0,0,0,1)):
-    points = np.genfromtxt(points_file, delimiter=",", dtype=int)
+def import_data_points_color(obj, bm, points_file, radius = 0.002, color = (0,0,0,1), attribute = "color"):
     mesh = obj.data
+    near = query_data_point_index(build_data_point_index(bm, points_file, radius), mesh)
+    
+    if attribute in mesh.vertex_colors.keys():
+        loop_vertices = np.empty(len(mesh.loops), dtype=np.int32)
+        mesh.loops.foreach_get("vertex_index", loop_vertices)
+        colors = np.empty(len(mesh.loops) * 4, dtype=np.float32)
+        mesh.vertex_colors[attribute].data.foreach_get("color", colors)
+        colors = colors.reshape(-1,4)
+        colors[near[loop_vertices]] = color
+        mesh.vertex_colors[attribute].data.foreach_set("color", colors.ravel())
+    else:
+        colors = np.empty(len(mesh.vertices) * 4, dtype=np.float32)
+        mesh.attributes[attribute].data.foreach_get("color", colors)
+        colors = colors.reshape(-1,4)
+        colors[near] = np.append(srgb_to_linear(color[:3]), color[3:])
+        mesh.attributes[attribute].data.foreach_set("color", colors.ravel())
     
-    bm.verts.ensure_lookup_table()
-    for poly in mesh.polygons:
-        for loop_idx in poly.loop_indices:
-            loop = mesh.loops[loop_idx]
-            vert = mesh.vertices[loop.vertex_index]
-            for i in points:
-                if (vert.co - bm.verts[i].co).length < radius:
-                    mesh.vertex_colors["Col"].data[loop_idx].color = color
+    mesh.update()
 
 
 
@@ -94,73 +210,80 @@ directory = os.getcwd()
 with open(os.path.join(directory,"render.py")) as file:
     exec(file.read())
 
-reset_scene()
+def build_scene():
+    reset_scene()
+    setup_layers()
+    setup_compositor(mask_center = (0.5,0.225), mask_size = (0.775,0.175), shadow_color_correction_exponent = 2.75)
+    setup_camera(offset = (0.005,0,0.12), distance = 0.6875, angle = (-np.pi/16, 0, 0), lens = 85, height = 495, crop = (1/15,13/15,1/20,9/10))
+    setup_lighting(offset = (0,0,0.11), shifts = (-0.8,-0.8,0.8), sizes = (0.6,1,0.2), energies = (7.5,2.875,3.75), 
+                   horizontal_angles = (5*np.pi/18, -2*np.pi/9, -2*np.pi/9), vertical_angles = (-5*np.pi/18, -2*np.pi/9, 5*np.pi/18))
+    bd_obj = create_backdrop(location = (0.005, -0.015, 0.053), scale = (0.25, 0.25, 0.25))
+    set_object_collections(backdrop = [bd_obj])
+
+load_scene_template("dr", build_scene)
 set_renderer_settings(num_samples = 2048 if bpy.app.background else 128)
-setup_layers()
-setup_compositor(mask_center = (0.5,0.225), mask_size = (0.775,0.175), shadow_color_correction_exponent = 2.75)
-setup_camera(offset = (0.005,0,0.12), distance = 0.6875, angle = (-np.pi/16, 0, 0), lens = 85, height = 495, crop = (1/15,13/15,1/20,9/10))
-setup_lighting(offset = (0,0,0.11), shifts = (-0.8,-0.8,0.8), sizes = (0.6,1,0.2), energies = (7.5,2.875,3.75), 
-               horizontal_angles = (5*np.pi/18, -2*np.pi/9, -2*np.pi/9), vertical_angles = (-5*np.pi/18, -2*np.pi/9, 5*np.pi/18))
 bm = import_bmesh(os.path.join(directory, "mgp", "dr.obj"))
 r_bm = create_voxel_remesh(bm)
-bd_obj = create_backdrop(location = (0.005, -0.015, 0.053), scale = (0.25, 0.25, 0.25))
-set_object_collections(backdrop = [bd_obj])
 
 
 if bpy.app.background:
     for file in ["dr_ker.csv"]:
-        import_color(bm, os.path.join(directory, "mgp", file), os.path.join(directory, "col", "viridis.csv"))
-        obj = add_mesh(r_bm)
-        mat = add_vertex_colors(obj)
-        transfer_vertex_colors_to_voxel_remesh(obj, bm)
-        obj.rotation_euler = (np.pi / 2, 0, 0)
-        bm.verts.ensure_lookup_table()
-        sph_location = bm.verts[0].co + 0.001 * bm.verts[0].normal
-        sph_obj = create_dot(location = (sph_location[0],sph_location[2],sph_location[1]), radius = 0.002, color = (0,0,0,1))
-        sph_mat = add_vertex_colors(sph_obj)
-        sph_mat.node_tree.nodes["Principled BSDF"].inputs["Roughness"].default_value = 1
-        set_object_collections(object = [obj, sph_obj])
-        bpy.context.scene.render.filepath = os.path.join(directory, "output", file.replace(".csv",".png"))
-        bpy.ops.render.render(use_viewport = True, write_still = True)
-        cleanup(objects = [obj,sph_obj], materials = [mat,sph_mat])
+        if not figure_selected(file.replace(".csv",".png"), bm = r_bm, extras = 1):
+            continue
+        with datablock_scope():
+            colors = compute_colors(len(bm.verts), os.path.join(directory, "mgp", file), os.path.join(directory, "col", "viridis.csv"))
+            obj = add_mesh(r_bm)
+            transfer_vertex_colors_to_voxel_remesh(obj, bm, colors)
+            mat = add_vertex_colors(obj)
+            obj.rotation_euler = (np.pi / 2, 0, 0)
+            bm.verts.ensure_lookup_table()
+            sph_location = bm.verts[0].co + 0.001 * bm.verts[0].normal
+            sph_obj = create_dot(location = (sph_location[0],sph_location[2],sph_location[1]), radius = 0.002, color = (0,0,0,1))
+            sph_mat = add_vertex_colors(sph_obj)
+            sph_mat.node_tree.nodes["Principled BSDF"].inputs["Roughness"].default_value = 1
+            set_object_collections(object = [obj, sph_obj])
+            render_figure(file.replace(".csv",".png"), (os.path.join(directory, "mgp", file), os.path.join(directory, "col", "viridis.csv")))
         
         
     for file in ["dr_gt.csv", "dr_m.csv", "dr_fn.csv"]:
-        import_color(bm, os.path.join(directory, "mgp", file), os.path.join(directory, "col", "plasma.csv"), bounds = (-2,2))
-        obj = add_mesh(r_bm)
-        mat = add_vertex_colors(obj)
-        transfer_vertex_colors_to_voxel_remesh(obj, bm)
-        subdivide_near_data_points(obj, os.path.join(directory, "mgp", "dr_loc.csv"))
-        import_data_points_color(obj, bm, os.path.join(directory, "mgp", "dr_loc.csv"))
-        obj.rotation_euler = (np.pi / 2, 0, 0)
-        set_object_collections(object = [obj])
-        bpy.context.scene.render.filepath = os.path.join(directory, "output", file.replace(".csv",".png"))
-        bpy.ops.render.render(use_viewport = True, write_still = True)
-        cleanup(objects = [obj], materials = [mat])
+        if not figure_selected(file.replace(".csv",".png"), bm = r_bm, extras = 1):
+            continue
+        with datablock_scope():
+            colors = compute_colors(len(bm.verts), os.path.join(directory, "mgp", file), os.path.join(directory, "col", "plasma.csv"), bounds = (-2,2))
+            obj = add_mesh(r_bm)
+            subdivide_near_data_points(obj, bm, os.path.join(directory, "mgp", "dr_loc.csv"))
+            transfer_vertex_colors_to_voxel_remesh(obj, bm, colors)
+            mat = add_vertex_colors(obj)
+            import_data_points_color(obj, bm, os.path.join(directory, "mgp", "dr_loc.csv"))
+            obj.rotation_euler = (np.pi / 2, 0, 0)
+            set_object_collections(object = [obj])
+            render_figure(file.replace(".csv",".png"), (os.path.join(directory, "mgp", file), os.path.join(directory, "col", "plasma.csv"), os.path.join(directory, "mgp", "dr_loc.csv")))
     
     
     for file in ["dr_std.csv"]:
-        import_color(bm, os.path.join(directory, "mgp", file), os.path.join(directory, "col", "viridis.csv"))
-        obj = add_mesh(r_bm)
-        mat = add_vertex_colors(obj)
-        transfer_vertex_colors_to_voxel_remesh(obj, bm)
-        subdivide_near_data_points(obj, os.path.join(directory, "mgp", "dr_loc.csv"))
-        import_data_points_color(obj, bm, os.path.join(directory, "mgp", "dr_loc.csv"), color = (0.8,0.8,0.8,1))
-        obj.rotation_euler = (np.pi / 2, 0, 0)
-        set_object_collections(object = [obj])
-        bpy.context.scene.render.filepath = os.path.join(directory, "output", file.replace(".csv",".png"))
-        bpy.ops.render.render(use_viewport = True, write_still = True)
-        cleanup(objects = [obj], materials = [mat])
+        if not figure_selected(file.replace(".csv",".png"), bm = r_bm, extras = 1):
+            continue
+        with datablock_scope():
+            colors = compute_colors(len(bm.verts), os.path.join(directory, "mgp", file), os.path.join(directory, "col", "viridis.csv"))
+            obj = add_mesh(r_bm)
+            subdivide_near_data_points(obj, bm, os.path.join(directory, "mgp", "dr_loc.csv"))
+            transfer_vertex_colors_to_voxel_remesh(obj, bm, colors)
+            mat = add_vertex_colors(obj)
+            import_data_points_color(obj, bm, os.path.join(directory, "mgp", "dr_loc.csv"), color = (0.8,0.8,0.8,1))
+            obj.rotation_euler = (np.pi / 2, 0, 0)
+            set_object_collections(object = [obj])
+            render_figure(file.replace(".csv",".png"), (os.path.join(directory, "mgp", file), os.path.join(directory, "col", "viridis.csv"), os.path.join(directory, "mgp", "dr_loc.csv")))
     
     
     for file in ["dr_e3.csv","dr_e100.csv"]:
-        import_color(bm, os.path.join(directory, "mgp", file), os.path.join(directory, "col", "viridis.csv"))
-        obj = add_mesh(r_bm)
-        mat = add_vertex_colors(obj)
-        transfer_vertex_colors_to_voxel_remesh(obj, bm)
-        obj.rotation_euler = (np.pi / 2, 0, 0)
-        set_object_collections(object = [obj])
-        bpy.context.scene.render.filepath = os.path.join(directory, "output", file.replace(".csv",".png"))
         set_resolution(330)
-        bpy.ops.render.render(use_viewport = True, write_still = True)
-        cleanup(objects = [obj], materials = [mat])
\ No newline at end of file
+        if not figure_selected(file.replace(".csv",".png"), bm = r_bm):
+            continue
+        with datablock_scope():
+            colors = compute_colors(len(bm.verts), os.path.join(directory, "mgp", file), os.path.join(directory, "col", "viridis.csv"))
+            obj = add_mesh(r_bm)
+            transfer_vertex_colors_to_voxel_remesh(obj, bm, colors)
+            mat = add_vertex_colors(obj)
+            obj.rotation_euler = (np.pi / 2, 0, 0)
+            set_object_collections(object = [obj])
+            render_figure(file.replace(".csv",".png"), (os.path.join(directory, "mgp", file), os.path.join(directory, "col", "viridis.csv")))
\ No newline at end of file
@@ -0,0 +1,154 @@
+import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import heapq
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+
+scripts = ("s2.py", "t2.py", "dr.py", "fn.py", "mvn.py")
+default_seconds_per_unit = 1e-5
+
+
+def blender_command(blender, script, args):
+    return [blender, "--background", "--python", script, "--"] + args
+
+
+def list_figures(blender, script, render_options = []):
+    result = subprocess.run(blender_command(blender, script, ["--list"] + render_options), cwd = directory, capture_output = True, text = True, check = True)
+    figures = [line.strip().split(" ", 2)[1:] for line in result.stdout.splitlines() if line.startswith("FIGURE ")]
+    return [(figure, json.loads(cost)) for (figure, cost) in figures]
+
+
+def history_path():
+    return os.path.join(directory, "farm_history.json")
+
+
+def load_history():
+    if not os.path.exists(history_path()):
+        return {}
+    with open(history_path()) as file:
+        return json.load(file)
+
+
+def save_history(history):
+    with open(history_path(), "w") as file:
+        json.dump(history, file, indent = 2, sort_keys = True)
+
+
+def cost_units(cost):
+    return cost["width"] * cost["height"] * cost["crop_area"] * cost["samples"] * cost["complexity"]
+
+
+def seconds_per_unit(history):
+    rates = [entry["seconds"] * entry["threads"] / entry["units"] for entry in history.values() if entry["units"] > 0]
+    return statistics.median(rates) if len(rates) > 0 else default_seconds_per_unit
+
+
+def predict_seconds(figure, cost, history, threads):
+    entry = history.get(figure)
+    if entry is not None and entry["units"] == cost_units(cost):
+        return entry["seconds"] * entry["threads"] / threads
+    return cost_units(cost) * seconds_per_unit(history) / threads
+
+
+def lpt_makespan(durations, num_workers):
+    loads = [0.0] * num_workers
+    for duration in sorted(durations, reverse = True):
+        heapq.heappush(loads, heapq.heappop(loads) + duration)
+    return max(loads)
+
+
+def job_label(script, figure, job_options):
+    return " ".join([figure if figure is not None else script] + job_options)
+
+
+def render_job(blender, script, figure, job_options, threads, render_options, log_directory):
+    start = time.perf_counter()
+    figure_options = ["--figures", figure] if figure is not None else []
+    log_name = "_".join([(figure or script).replace(".png", "").replace(".py", "")] + [option.strip("-") for option in job_options])
+    log_file = os.path.join(log_directory, log_name + ".log")
+    with open(log_file, "w") as log:
+        result = subprocess.run(blender_command(blender, script, figure_options + job_options + ["--threads", str(threads)] + render_options), 
+                                cwd = directory, stdout = log, stderr = subprocess.STDOUT)
+    duration = time.perf_counter() - start
+    with open(log_file) as log:
+        skipped = "Skipping %s" % figure in log.read()
+    return (script, figure, job_options, result.returncode, duration, skipped)
+
+
+def run_farm(blender, jobs, num_workers, threads, render_options = [], output_directory = "output", predictions = None):
+    log_directory = os.path.join(directory, "output", "logs")
+    os.makedirs(log_directory, exist_ok = True)
+    
+    if predictions is not None:
+        jobs = [job for (prediction, job) in sorted(zip(predictions, jobs), key = lambda pair: pair[0], reverse = True)]
+        print("predicted makespan %.1fs for %i jobs" % (lpt_makespan(predictions, num_workers), len(jobs)))
+    
+    failures = []
+    timings = []
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers = num_workers) as pool:
+        futures = [pool.submit(render_job, blender, script, figure, job_options, threads, render_options, log_directory) for (script, figure, job_options) in jobs]
+        for future in as_completed(futures):
+            (script, figure, job_options, returncode, duration, skipped) = future.result()
+            writes_output = figure is not None and "--tile" not in job_options
+            if returncode != 0 or (writes_output and not os.path.exists(os.path.join(directory, output_directory, figure))):
+                failures.append((script, figure))
+                print("FAILED %s %s (%.1fs)" % (script, job_label(script, figure, job_options), duration))
+            else:
+                print("done %s %s (%.1fs)" % (script, job_label(script, figure, job_options), duration))
+                if not skipped:
+                    timings.append((figure, job_options, duration))
+    
+    print("%i jobs in %.1fs actual makespan with %i workers x %i threads" % (len(jobs), time.perf_counter() - start, num_workers, threads))
+    return (failures, timings)
+
+
+directory = os.path.dirname(os.path.abspath(__file__))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--blender", default = os.environ.get("BLENDER", "blender"))
+    parser.add_argument("--workers", type = int, default = 4)
+    parser.add_argument("--threads", type = int, default = 0)
+    parser.add_argument("--profile", choices = ("draft","final","cpu-batch"), default = "cpu-batch")
+    parser.add_argument("--auto-samples", action = "store_true")
+    parser.add_argument("--draft", nargs = "?", const = "EEVEE", choices = ("EEVEE","WORKBENCH"))
+    parser.add_argument("--tiles", type = int, default = 1)
+    parser.add_argument("--scripts", nargs = "+", default = scripts)
+    parser.add_argument("--figures", nargs = "+")
+    args = parser.parse_args()
+    
+    threads = args.threads if args.threads > 0 else max(1, os.cpu_count() // args.workers)
+    render_options = ["--profile", args.profile] + (["--auto-samples"] if args.auto_samples else [])
+    
+    if args.draft is not None:
+        jobs = [(script, None, []) for script in args.scripts]
+        (failures, _) = run_farm(args.blender, jobs, args.workers, threads, render_options + ["--draft", args.draft], os.path.join("output", "draft"))
+        subprocess.run(blender_command(args.blender, "sheet.py", []), cwd = directory, check = True)
+        sys.exit(1 if failures else 0)
+    
+    figures = [(script, figure, cost) for script in args.scripts for (figure, cost) in list_figures(args.blender, script, render_options) 
+               if args.figures is None or figure in args.figures]
+    history = load_history()
+    predictions = {figure: predict_seconds(figure, cost, history, threads) for (script, figure, cost) in figures}
+    
+    if args.tiles > 1:
+        tile_options = ["--tiles", str(args.tiles)]
+        tile_jobs = [(script, figure, tile_options + ["--tile", str(index)]) for (script, figure, cost) in figures for index in range(args.tiles)]
+        (failures, _) = run_farm(args.blender, tile_jobs, args.workers, threads, render_options, predictions = [predictions[figure] / args.tiles for (script, figure, job_options) in tile_jobs])
+        if not failures:
+            (failures, _) = run_farm(args.blender, [(script, figure, tile_options + ["--stitch"]) for (script, figure, cost) in figures], args.workers, threads, render_options)
+        sys.exit(1 if failures else 0)
+    
+    (failures, timings) = run_farm(args.blender, [(script, figure, []) for (script, figure, cost) in figures], args.workers, threads, render_options, 
+                                   predictions = [predictions[figure] for (script, figure, cost) in figures])
+    costs = {figure: cost for (script, figure, cost) in figures}
+    for (figure, job_options, duration) in timings:
+        history[figure] = {"units": cost_units(costs[figure]), "threads": threads, "seconds": duration}
+    save_history(history)
+    sys.exit(1 if failures else 0)
@@ -1,11 +1,581 @@
+import argparse
 import bpy
 import bmesh
+from contextlib import contextmanager
 from functools import partial
+from itertools import groupby
+import hashlib
+import json
 import numpy as np
 import os
+import sys
+import types
 from mathutils import Vector
 
 
+def parse_render_args():
+    parser = argparse.ArgumentParser(prog = "blender --background --python <script> --")
+    parser.add_argument("--figures", nargs = "+")
+    parser.add_argument("--list", action = "store_true")
+    parser.add_argument("--force", action = "store_true")
+    parser.add_argument("--threads", type = int, default = 0)
+    parser.add_argument("--device", choices = ("CPU","GPU"))
+    parser.add_argument("--profile", choices = ("draft","final","cpu-batch"))
+    parser.add_argument("--auto-samples", action = "store_true")
+    parser.add_argument("--draft", nargs = "?", const = "EEVEE", choices = ("EEVEE","WORKBENCH"))
+    parser.add_argument("--tiles", type = int, default = 1)
+    parser.add_argument("--tile", type = int, default = 0)
+    parser.add_argument("--stitch", action = "store_true")
+    parser.add_argument("--target-error", type = float, default = 0.002)
+    return parser.parse_args(sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else [])
+
+
+render_args = parse_render_args()
+
+
+def figure_cost(spec = None, bm = None, extras = 0):
+    render = bpy.data.scenes["Scene"].render
+    height = spec["resolution"] if spec is not None else render.resolution_y
+    width = height // 2 * 3 if spec is not None else render.resolution_x
+    crop_area = (render.border_max_x - render.border_min_x) * (render.border_max_y - render.border_min_y) if render.use_border else 1
+    faces = len(bm.faces) if bm is not None else 0
+    return {
+        "width": width,
+        "height": height,
+        "crop_area": crop_area,
+        "samples": bpy.data.scenes["Scene"].cycles.samples,
+        "faces": faces,
+        "complexity": (1 + len(spec.get("vector_fields", [])) + ("setup" in spec) if spec is not None else 1 + extras) * (1 + faces / 1e6),
+    }
+
+
+def figure_selected(name, spec = None, bm = None, extras = 0):
+    if render_args.list:
+        print("FIGURE %s %s" % (name, json.dumps(figure_cost(spec, bm, extras))))
+        return False
+    return render_args.figures is None or name in render_args.figures
+
+
+scene_parameters = {}
+
+
+def record_scene_parameters(name, parameters):
+    scene_parameters[name] = parameters
+
+
+def code_hash(code):
+    hash = hashlib.sha1(code.co_code)
+    hash.update(repr(code.co_names).encode())
+    for constant in code.co_consts:
+        hash.update((code_hash(constant) if isinstance(constant, types.CodeType) else repr(constant)).encode())
+    return hash.hexdigest()
+
+
+def fingerprint_value(value):
+    if isinstance(value, dict):
+        return {str(key): fingerprint_value(item) for (key, item) in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [fingerprint_value(item) for item in value]
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, partial):
+        return [fingerprint_value(value.func), fingerprint_value(value.args), fingerprint_value(value.keywords)]
+    if isinstance(value, types.FunctionType):
+        return code_hash(value.__code__)
+    if isinstance(value, bpy.types.ID):
+        return value.name
+    if isinstance(value, str) and os.path.isfile(value):
+        return file_hash(value)
+    return value
+
+
+def render_settings():
+    scene = bpy.data.scenes["Scene"]
+    return {
+        "engine": scene.render.engine,
+        "samples": scene.cycles.samples,
+        "resolution": (scene.render.resolution_x, scene.render.resolution_y),
+        "border": (scene.render.use_border, scene.render.border_min_x, scene.render.border_max_x, scene.render.border_min_y, scene.render.border_max_y),
+        "device": scene.cycles.device,
+        "adaptive_sampling": (scene.cycles.use_adaptive_sampling, scene.cycles.adaptive_threshold, scene.cycles.adaptive_min_samples),
+        "bounces": (scene.cycles.max_bounces, scene.cycles.diffuse_bounces, scene.cycles.glossy_bounces, scene.cycles.transmission_bounces, scene.cycles.transparent_max_bounces),
+        "denoising": (scene.cycles.use_denoising, scene.cycles.denoiser),
+    }
+
+
+def code_files():
+    files = [os.path.join(directory, "render.py")]
+    for flag in ("--python", "-P"):
+        if flag in sys.argv:
+            files.append(os.path.abspath(sys.argv[sys.argv.index(flag) + 1]))
+    return files
+
+
+def figure_fingerprint(inputs = ()):
+    fingerprint = fingerprint_value([scene_parameters, render_settings(), inputs, [file_hash(file) for file in code_files()]])
+    return hashlib.sha1(json.dumps(fingerprint, sort_keys = True, default = str).encode()).hexdigest()
+
+
+def background_pass_key():
+    scene = bpy.data.scenes["Scene"]
+    bpy.context.view_layer.update()
+    camera = [[list(row) for row in scene.camera.matrix_world], scene.camera.data.lens]
+    lights = [[obj.name, [list(row) for row in obj.matrix_world], obj.data.type, obj.data.energy, list(obj.data.color), 
+               obj.data.size if obj.data.type == "AREA" else obj.data.shadow_soft_size] 
+              for obj in scene.objects if obj.type == "LIGHT" and not obj.hide_render]
+    backdrop = [[obj.name, [list(row) for row in obj.matrix_world]] for obj in bpy.data.collections["Backdrop"].objects]
+    state = [camera, lights, backdrop, render_settings(), file_hash(os.path.join(directory, "render.py")), bpy.app.version_string]
+    return hashlib.sha1(json.dumps(state, sort_keys = True, default = str).encode()).hexdigest()
+
+
+def background_pass_cacheable():
+    scene = bpy.context.scene
+    if not scene.use_nodes or "Background Layer" not in scene.view_layers.keys() or "Background Layer" not in scene.node_tree.nodes.keys():
+        return False
+    return not any(obj.type == "MESH" and not obj.hide_render for obj in scene.collection.objects)
+
+
+def render_with_cached_background():
+    if not background_pass_cacheable():
+        bpy.ops.render.render(use_viewport = True, write_still = True)
+        return
+    
+    scene = bpy.context.scene
+    key = background_pass_key()
+    background_file = cache_path("passes", key + ".exr")
+    background_layer_node = scene.node_tree.nodes["Background Layer"]
+    
+    if os.path.exists(background_file):
+        image_node = scene.node_tree.nodes.new("CompositorNodeImage")
+        image_node.image = bpy.data.images.load(background_file)
+        to_sockets = [link.to_socket for link in background_layer_node.outputs["Image"].links]
+        for to_socket in to_sockets:
+            scene.node_tree.links.new(image_node.outputs["Image"], to_socket)
+        scene.view_layers["Background Layer"].use = False
+        
+        bpy.ops.render.render(use_viewport = True, write_still = True)
+        
+        scene.view_layers["Background Layer"].use = True
+        for to_socket in to_sockets:
+            scene.node_tree.links.new(background_layer_node.outputs["Image"], to_socket)
+        image = image_node.image
+        scene.node_tree.nodes.remove(image_node)
+        bpy.data.images.remove(image)
+    else:
+        output_node = scene.node_tree.nodes.new("CompositorNodeOutputFile")
+        output_node.format.file_format = "OPEN_EXR"
+        output_node.format.color_depth = "32"
+        output_node.base_path = os.path.dirname(background_file)
+        output_node.file_slots[0].path = "%s.%i_" % (key, os.getpid())
+        scene.node_tree.links.new(background_layer_node.outputs["Image"], output_node.inputs[0])
+        
+        bpy.ops.render.render(use_viewport = True, write_still = True)
+        
+        scene.node_tree.nodes.remove(output_node)
+        os.replace(os.path.join(os.path.dirname(background_file), "%s.%i_%04i.exr" % (key, os.getpid(), scene.frame_current)), background_file)
+
+
+def manifest_path(name, manifest = "manifest"):
+    path = os.path.join(directory, "output_%s" % manifest, name + ".json")
+    os.makedirs(os.path.dirname(path), exist_ok = True)
+    return path
+
+
+def load_manifest(name, manifest = "manifest"):
+    if not os.path.exists(manifest_path(name, manifest)):
+        return None
+    with open(manifest_path(name, manifest)) as file:
+        return json.load(file)
+
+
+def update_manifest(name, value, manifest = "manifest"):
+    temporary_path = "%s.%i.tmp" % (manifest_path(name, manifest), os.getpid())
+    with open(temporary_path, "w") as file:
+        json.dump(value, file)
+    os.replace(temporary_path, manifest_path(name, manifest))
+
+
+def figure_up_to_date(name, fingerprint):
+    if render_args.force or render_args.draft is not None or not os.path.exists(os.path.join(directory, "output", name)):
+        return False
+    return load_manifest(name) == fingerprint
+
+
+def render_draft(name):
+    scene = bpy.context.scene
+    layers_used = {view_layer.name: view_layer.use for view_layer in scene.view_layers}
+    use_nodes = scene.use_nodes
+    for view_layer in scene.view_layers:
+        view_layer.use = view_layer.name == "View Layer"
+    scene.use_nodes = False
+    
+    scene.render.filepath = os.path.join(directory, "output", "draft", name)
+    bpy.ops.render.render(use_viewport = True, write_still = True)
+    
+    for view_layer in scene.view_layers:
+        view_layer.use = layers_used[view_layer.name]
+    scene.use_nodes = use_nodes
+
+
+def write_contact_sheet(cell_height = 240, columns = None):
+    draft_directory = os.path.join(directory, "output", "draft")
+    if not os.path.isdir(draft_directory):
+        return
+    image_files = sorted(file for file in os.listdir(draft_directory) if file.endswith(".png") and file != "contact_sheet.png")
+    if len(image_files) == 0:
+        return
+    columns = columns if columns is not None else int(np.ceil(np.sqrt(len(image_files))))
+    rows = int(np.ceil(len(image_files) / columns))
+    cell_width = cell_height // 2 * 3
+    sheet = np.ones((rows * cell_height, columns * cell_width, 4), dtype=np.float32)
+    
+    for (idx, image_file) in enumerate(image_files):
+        pixels = load_pixels(os.path.join(draft_directory, image_file))
+        (height, width) = pixels.shape[:2]
+        scale = min(cell_width / width, cell_height / height)
+        rows_index = np.minimum((np.arange(int(height * scale)) / scale).astype(int), height - 1)
+        columns_index = np.minimum((np.arange(int(width * scale)) / scale).astype(int), width - 1)
+        cell = pixels[rows_index[:,np.newaxis], columns_index[np.newaxis,:]]
+        alpha = cell[...,3:4]
+        (row, column) = (rows - 1 - idx // columns, idx % columns)
+        target = sheet[row * cell_height : row * cell_height + cell.shape[0], column * cell_width : column * cell_width + cell.shape[1]]
+        target[...] = cell * alpha + target * (1 - alpha)
+    
+    sheet[...,3] = 1
+    image = bpy.data.images.new("Contact Sheet", width = columns * cell_width, height = rows * cell_height, alpha = True)
+    image.pixels.foreach_set(sheet.ravel())
+    image.filepath_raw = os.path.join(draft_directory, "contact_sheet.png")
+    image.file_format = "PNG"
+    image.save()
+    bpy.data.images.remove(image)
+
+
+def render_figure(name, inputs = (), profile = None):
+    apply_render_profile(figure_profile(profile))
+    if not figure_selected(name):
+        return
+    if render_args.draft is not None:
+        render_draft(name)
+        return
+    fingerprint = figure_fingerprint(inputs)
+    if figure_up_to_date(name, fingerprint):
+        print("Skipping %s, inputs unchanged" % name)
+        return
+    bpy.context.scene.render.filepath = os.path.join(directory, "output", name)
+    if render_args.tiles > 1 and not render_args.stitch:
+        render_tile(name, render_args.tile, render_args.tiles)
+        return
+    elif render_args.tiles > 1:
+        stitch_tiles(name, render_args.tiles)
+    elif render_args.auto_samples:
+        update_manifest(name, render_until_converged(name), "samples")
+    else:
+        render_with_cached_background()
+    update_manifest(name, fingerprint)
+
+
+def load_pixels(image_file):
+    image = bpy.data.images.load(image_file)
+    (width, height) = image.size
+    pixels = np.empty(len(image.pixels), dtype=np.float32)
+    image.pixels.foreach_get(pixels)
+    bpy.data.images.remove(image)
+    return pixels.reshape(height, width, 4)
+
+
+def tile_border(index, num_tiles):
+    render = bpy.data.scenes["Scene"].render
+    height = render.resolution_y * render.resolution_percentage // 100
+    (min_y, max_y) = (render.border_min_y, render.border_max_y) if render.use_border else (0, 1)
+    rows = [int(min_y * height) + round(k * (int(max_y * height) - int(min_y * height)) / num_tiles) for k in range(num_tiles + 1)]
+    tile_min_y = min_y if index == 0 else (rows[index] + 0.5) / height
+    tile_max_y = max_y if index == num_tiles - 1 else (rows[index + 1] + 0.5) / height
+    return (tile_min_y, tile_max_y)
+
+
+tile_passes = ("Image", "Denoising Normal", "Denoising Albedo")
+
+
+def tile_pass_file(name, layer, index, render_pass = "Image"):
+    return cache_path("tiles", "%s.%s.%s.%i.exr" % (os.path.splitext(name)[0], layer.replace(" ", "_"), render_pass.replace(" ", "_"), index))
+
+
+def render_layer_nodes():
+    return [node for node in bpy.context.scene.node_tree.nodes if node.type == "R_LAYERS"]
+
+
+@contextmanager
+def compositor_scope():
+    scene = bpy.context.scene
+    use_nodes = scene.use_nodes
+    if not use_nodes:
+        scene.use_nodes = True
+        scene.node_tree.nodes.clear()
+        layer_node = scene.node_tree.nodes.new("CompositorNodeRLayers")
+        layer_node.layer = "View Layer"
+        composite_node = scene.node_tree.nodes.new("CompositorNodeComposite")
+        scene.node_tree.links.new(layer_node.outputs["Image"], composite_node.inputs["Image"])
+    try:
+        yield
+    finally:
+        if not use_nodes:
+            scene.node_tree.nodes.clear()
+            scene.use_nodes = False
+
+
+def add_pass_output(layer_node, render_passes, pass_files):
+    scene = bpy.context.scene
+    output_node = scene.node_tree.nodes.new("CompositorNodeOutputFile")
+    output_node.format.file_format = "OPEN_EXR"
+    output_node.format.color_depth = "32"
+    output_node.base_path = os.path.dirname(pass_files[0])
+    for (slot, (render_pass, pass_file)) in enumerate(zip(render_passes, pass_files)):
+        if slot > 0:
+            output_node.file_slots.new(render_pass)
+        output_node.file_slots[slot].path = os.path.basename(pass_file) + "_"
+        scene.node_tree.links.new(layer_node.outputs[render_pass], output_node.inputs[slot])
+    return output_node
+
+
+def remove_pass_output(output_node, pass_files):
+    scene = bpy.context.scene
+    scene.node_tree.nodes.remove(output_node)
+    for pass_file in pass_files:
+        os.replace("%s_%04i.exr" % (pass_file, scene.frame_current), pass_file)
+
+
+def render_tile(name, index, num_tiles):
+    scene = bpy.context.scene
+    render = scene.render
+    border = (render.use_border, render.use_crop_to_border, render.border_min_x, render.border_max_x, render.border_min_y, render.border_max_y)
+    if not render.use_border:
+        (render.border_min_x, render.border_max_x) = (0, 1)
+    (render.border_min_y, render.border_max_y) = tile_border(index, num_tiles)
+    render.use_border = True
+    render.use_crop_to_border = True
+    scene.cycles.seed = int(hashlib.sha1(name.encode()).hexdigest(), 16) % (1 << 31)
+    scene.cycles.use_animated_seed = False
+    use_denoising = scene.cycles.use_denoising
+    scene.cycles.use_denoising = False
+    store_passes = {view_layer.name: view_layer.cycles.denoising_store_passes for view_layer in scene.view_layers}
+    for view_layer in scene.view_layers:
+        view_layer.cycles.denoising_store_passes = True
+    
+    with compositor_scope():
+        output_nodes = []
+        for layer_node in render_layer_nodes():
+            pass_files = [tile_pass_file(name, layer_node.layer, index, render_pass) for render_pass in tile_passes]
+            output_nodes.append((add_pass_output(layer_node, tile_passes, pass_files), pass_files))
+        
+        render.filepath = cache_path("tiles", "%s.%i.png" % (os.path.splitext(name)[0], index))
+        bpy.ops.render.render(use_viewport = True, write_still = True)
+        
+        for (output_node, pass_files) in output_nodes:
+            remove_pass_output(output_node, pass_files)
+    for view_layer in scene.view_layers:
+        view_layer.cycles.denoising_store_passes = store_passes[view_layer.name]
+    scene.cycles.use_denoising = use_denoising
+    (render.use_border, render.use_crop_to_border, render.border_min_x, render.border_max_x, render.border_min_y, render.border_max_y) = border
+
+
+def stitch_tiles(name, num_tiles):
+    scene = bpy.context.scene
+    with compositor_scope():
+        image_nodes = []
+        for layer_node in render_layer_nodes():
+            pass_nodes = []
+            for render_pass in tile_passes if scene.cycles.use_denoising else tile_passes[:1]:
+                pixels = np.concatenate([load_pixels(tile_pass_file(name, layer_node.layer, index, render_pass)) for index in range(num_tiles)], axis=0)
+                image = bpy.data.images.new("Stitched %s %s" % (layer_node.layer, render_pass), width = pixels.shape[1], height = pixels.shape[0], alpha = True, float_buffer = True)
+                image.pixels.foreach_set(pixels.ravel())
+                image_node = scene.node_tree.nodes.new("CompositorNodeImage")
+                image_node.image = image
+                pass_nodes.append(image_node)
+            output = pass_nodes[0].outputs["Image"]
+            if scene.cycles.use_denoising:
+                denoise_node = scene.node_tree.nodes.new("CompositorNodeDenoise")
+                denoise_node.use_hdr = True
+                for (image_node, denoise_input) in zip(pass_nodes, ("Image", "Normal", "Albedo")):
+                    scene.node_tree.links.new(image_node.outputs["Image"], denoise_node.inputs[denoise_input])
+                pass_nodes.append(denoise_node)
+                output = denoise_node.outputs["Image"]
+            to_sockets = [link.to_socket for link in layer_node.outputs["Image"].links]
+            for to_socket in to_sockets:
+                scene.node_tree.links.new(output, to_socket)
+            image_nodes.append((layer_node, pass_nodes, to_sockets))
+        
+        layers_used = {view_layer.name: view_layer.use for view_layer in scene.view_layers}
+        for view_layer in scene.view_layers:
+            view_layer.use = view_layer.name == image_nodes[0][0].layer
+        (samples, use_denoising) = (scene.cycles.samples, scene.cycles.use_denoising)
+        (scene.cycles.samples, scene.cycles.use_denoising) = (1, False)
+        
+        bpy.ops.render.render(use_viewport = True, write_still = True)
+        
+        (scene.cycles.samples, scene.cycles.use_denoising) = (samples, use_denoising)
+        for view_layer in scene.view_layers:
+            view_layer.use = layers_used[view_layer.name]
+        for (layer_node, pass_nodes, to_sockets) in image_nodes:
+            for to_socket in to_sockets:
+                scene.node_tree.links.new(layer_node.outputs["Image"], to_socket)
+            for node in pass_nodes:
+                image = node.image if node.type == "IMAGE" else None
+                scene.node_tree.nodes.remove(node)
+                if image is not None:
+                    bpy.data.images.remove(image)
+
+
+def render_until_converged(name, min_samples = 64):
+    scene = bpy.data.scenes["Scene"]
+    max_samples = scene.cycles.samples
+    recorded_samples = load_manifest(name, "samples") or 0
+    if recorded_samples >= max_samples:
+        render_with_cached_background()
+        return max_samples
+    samples = min(max_samples, max(min_samples, recorded_samples // 2))
+    previous = None
+    
+    while True:
+        scene.cycles.samples = samples
+        pixels = render_noisy_passes(name)
+        if previous is not None:
+            (previous_pixels, previous_samples) = previous
+            error = np.sqrt(np.mean((pixels - previous_pixels)**2) / (samples / previous_samples - 1))
+            print("%s: %i samples, error %.5f" % (name, samples, error))
+            if error < render_args.target_error:
+                break
+        if samples >= max_samples:
+            break
+        next_samples = 2 * samples if previous is None else int(np.ceil(samples * (error / render_args.target_error)**2))
+        previous = (pixels, samples)
+        samples = min(max_samples, max(2 * samples, next_samples))
+    
+    scene.cycles.samples = max_samples
+    return samples
+
+
+def render_noisy_passes(name):
+    scene = bpy.context.scene
+    render_pass = "Noisy Image" if scene.cycles.use_denoising else "Image"
+    with compositor_scope():
+        layer_nodes = [node for node in render_layer_nodes() if scene.view_layers[node.layer].use and node.layer != "Background Layer"]
+        store_passes = {view_layer.name: view_layer.cycles.denoising_store_passes for view_layer in scene.view_layers}
+        for view_layer in scene.view_layers:
+            view_layer.cycles.denoising_store_passes = True
+        pass_files = [cache_path("samples", "%s.%s.%i.exr" % (os.path.splitext(name)[0], node.layer.replace(" ", "_"), os.getpid())) for node in layer_nodes]
+        output_nodes = [add_pass_output(node, [render_pass], [pass_file]) for (node, pass_file) in zip(layer_nodes, pass_files)]
+        
+        render_with_cached_background()
+        
+        for (output_node, pass_file) in zip(output_nodes, pass_files):
+            remove_pass_output(output_node, [pass_file])
+        for view_layer in scene.view_layers:
+            view_layer.cycles.denoising_store_passes = store_passes[view_layer.name]
+    pixels = np.concatenate([load_pixels(pass_file) for pass_file in pass_files], axis=0)
+    for pass_file in pass_files:
+        os.remove(pass_file)
+    return pixels
+
+
+def color_attribute_name(spec):
+    return "color_" + os.path.splitext(spec["output"])[0]
+
+
+def shares_mesh(spec):
+    return "setup" not in spec and spec.get("domain", "POINT") == "POINT"
+
+
+def set_color_attribute(obj, mat, attribute):
+    nodes = mat.node_tree.nodes
+    alpha_input = nodes["Principled BSDF"].inputs["Alpha"]
+    nodes["Color Attribute"].attribute_name = attribute
+    for link in alpha_input.links:
+        mat.node_tree.links.remove(link)
+    alpha_input.default_value = 1
+    if attribute + "_alpha" in obj.data.attributes.keys():
+        alpha_node = nodes["Alpha Attribute"] if "Alpha Attribute" in nodes.keys() else nodes.new("ShaderNodeAttribute")
+        alpha_node.name = "Alpha Attribute"
+        alpha_node.attribute_name = attribute + "_alpha"
+        mat.node_tree.links.new(alpha_node.outputs["Fac"], alpha_input)
+
+
+def build_shared_figure(bm, specs):
+    obj = add_mesh(bm)
+    for spec in specs:
+        colors = compute_colors(len(obj.data.vertices), spec.get("data_file"), spec.get("palette_file"), spec.get("color"), spec.get("bounds"))
+        set_vertex_colors(obj, colors, name = color_attribute_name(spec))
+    mat = add_vertex_colors(obj, attribute = color_attribute_name(specs[0]))
+    set_object_collections(object = [obj])
+    
+    return {"object": obj, "material": mat}
+
+
+def build_figure(bm, spec, shared = None):
+    if shared is None:
+        obj = add_mesh(bm)
+        import_color(obj, data_file = spec.get("data_file"), palette_file = spec.get("palette_file"), color = spec.get("color"), bounds = spec.get("bounds"), domain = spec.get("domain", "POINT"))
+        mat = add_vertex_colors(obj)
+        set_object_collections(object = [obj])
+    else:
+        (obj, mat) = (shared["object"], shared["material"])
+        set_color_attribute(obj, mat, color_attribute_name(spec))
+        obj.scale = (1,1,1)
+        obj.rotation_euler = (0,0,0)
+    mat.node_tree.nodes["Principled BSDF"].inputs["Roughness"].default_value = spec.get("roughness", 0.5)
+    
+    vf_objs = [add_vector_field(import_vector_field(vf_file), instance_obj, scale = vf_scale) for (vf_file, instance_obj, vf_scale) in spec.get("vector_fields", [])]
+    set_object_collections(object = vf_objs)
+    for figure_obj in [obj] + vf_objs:
+        if "scale" in spec:
+            figure_obj.scale = spec["scale"]
+        if "rotation" in spec:
+            figure_obj.rotation_euler = spec["rotation"]
+    
+    return {"object": obj, "material": mat, "vector_fields": vf_objs}
+
+
+def prepare_spec(spec):
+    set_resolution(spec["resolution"])
+    apply_render_profile(figure_profile(spec.get("profile")))
+
+
+def render_spec(bm, spec, shared = None):
+    prepare_spec(spec)
+    with datablock_scope():
+        figure = build_figure(bm, spec, shared)
+        if "setup" in spec:
+            spec["setup"](figure)
+        render_figure(spec["output"], spec, spec.get("profile"))
+        if "teardown" in spec:
+            spec["teardown"](figure)
+
+
+def execute_figures(specs):
+    specs = sorted([spec for spec in specs if figure_selected(spec["output"], spec)], key = lambda spec: spec["mesh_file"])
+    for (mesh_file, mesh_specs) in groupby(specs, key = lambda spec: spec["mesh_file"]):
+        bm = import_bmesh(mesh_file)
+        pending_specs = []
+        for spec in mesh_specs:
+            prepare_spec(spec)
+            if figure_up_to_date(spec["output"], figure_fingerprint(spec)):
+                print("Skipping %s, inputs unchanged" % spec["output"])
+            else:
+                pending_specs.append(spec)
+        
+        shared_specs = [spec for spec in pending_specs if shares_mesh(spec)]
+        if len(shared_specs) > 0:
+            with datablock_scope():
+                shared = build_shared_figure(bm, shared_specs)
+                for spec in shared_specs:
+                    render_spec(bm, spec, shared)
+        for spec in pending_specs:
+            if not shares_mesh(spec):
+                render_spec(bm, spec)
+        bm.free()
+
+
 def reset_scene():
     for obj in bpy.data.objects:
         bpy.data.objects.remove(obj, do_unlink=True)
@@ -43,13 +613,108 @@ def cleanup(objects = None, materials = None, modifiers = None, force = False):
                     bpy.data.node_groups.remove(modifier.node_group, do_unlink=True)
         if objects is not None:
             for obj in objects:
+                data = obj.data
                 bpy.data.objects.remove(obj, do_unlink=True)
+                if isinstance(data, bpy.types.Mesh) and data.users == 0:
+                    bpy.data.meshes.remove(data)
+
+
+datablock_types = ("objects", "meshes", "materials", "node_groups", "images", "lights")
+
+
+def scoped_datablock(datablock):
+    return not isinstance(datablock, bpy.types.Image) or datablock.type not in ("RENDER_RESULT", "COMPOSITING")
+
+
+def count_datablocks():
+    return {datablock_type: len(getattr(bpy.data, datablock_type)) for datablock_type in datablock_types}
+
+
+@contextmanager
+def datablock_scope(debug = bool(os.environ.get("DATABLOCK_DEBUG")), force = False):
+    existing = {datablock_type: {datablock.as_pointer() for datablock in getattr(bpy.data, datablock_type)} for datablock_type in datablock_types}
+    if debug:
+        print("Datablocks before scope: %s" % count_datablocks())
+    try:
+        yield
+    finally:
+        if bpy.app.background or force:
+            for datablock_type in datablock_types:
+                collection = getattr(bpy.data, datablock_type)
+                for datablock in [datablock for datablock in collection if datablock.as_pointer() not in existing[datablock_type] and scoped_datablock(datablock)]:
+                    collection.remove(datablock, do_unlink=True)
+        if debug:
+            print("Datablocks after scope: %s" % count_datablocks())
 
 
-def set_renderer_settings(num_samples = 128):
+def load_scene_template(name, build_scene):
+    key = hashlib.sha1((code_hash(build_scene.__code__) + file_hash(os.path.join(directory, "render.py")) + bpy.app.version_string + str(render_args.draft)).encode()).hexdigest()
+    template_file = cache_path("scenes", "%s.%s.blend" % (name, key))
+    
+    if os.path.exists(template_file):
+        bpy.ops.wm.open_mainfile(filepath = template_file, load_ui = False)
+        scene_parameters.update(json.loads(bpy.data.scenes["Scene"]["scene_parameters"]))
+    else:
+        build_scene()
+        bpy.data.scenes["Scene"]["scene_parameters"] = json.dumps(fingerprint_value(scene_parameters), default = str)
+        temp_file = "%s.%i.blend" % (template_file[:-6], os.getpid())
+        bpy.ops.wm.save_as_mainfile(filepath = temp_file, copy = True)
+        os.replace(temp_file, template_file)
+
+
+render_profiles = {
+    "draft": {"device": "GPU", "threads": 0, "tile_size": 64, "use_persistent_data": False, "max_samples": 64,
+              "use_adaptive_sampling": True, "adaptive_threshold": 0.05, "adaptive_min_samples": 16,
+              "max_bounces": 4, "diffuse_bounces": 2, "glossy_bounces": 2, "transmission_bounces": 2, "transparent_max_bounces": 4},
+    "final": {"device": "GPU", "threads": 0, "tile_size": 256, "use_persistent_data": False, "max_samples": None,
+              "use_adaptive_sampling": False, "adaptive_threshold": 0, "adaptive_min_samples": 0,
+              "max_bounces": 12, "diffuse_bounces": 4, "glossy_bounces": 4, "transmission_bounces": 12, "transparent_max_bounces": 8},
+    "cpu-batch": {"device": "CPU", "threads": 0, "tile_size": 32, "use_persistent_data": True, "max_samples": None,
+                  "use_adaptive_sampling": True, "adaptive_threshold": 0.005, "adaptive_min_samples": 128,
+                  "max_bounces": 8, "diffuse_bounces": 3, "glossy_bounces": 3, "transmission_bounces": 4, "transparent_max_bounces": 8},
+}
+
+
+def figure_profile(profile = None):
+    if render_args.profile is not None:
+        return render_args.profile
+    return profile if profile is not None else scene_parameters["renderer"]["profile"]
+
+
+def apply_render_profile(name):
+    profile = render_profiles[name]
+    scene = bpy.data.scenes["Scene"]
+    num_samples = scene_parameters["renderer"]["num_samples"]
+    threads = render_args.threads if render_args.threads > 0 else profile["threads"]
+    
+    scene.cycles.device = render_args.device if render_args.device is not None else profile["device"]
+    scene.render.threads_mode = "FIXED" if threads > 0 else "AUTO"
+    if threads > 0:
+        scene.render.threads = threads
+    scene.render.tile_x = profile["tile_size"]
+    scene.render.tile_y = profile["tile_size"]
+    scene.render.use_persistent_data = profile["use_persistent_data"]
+    scene.cycles.samples = num_samples if profile["max_samples"] is None else min(num_samples, profile["max_samples"])
+    scene.cycles.use_adaptive_sampling = profile["use_adaptive_sampling"]
+    if profile["use_adaptive_sampling"]:
+        scene.cycles.adaptive_threshold = profile["adaptive_threshold"]
+        scene.cycles.adaptive_min_samples = profile["adaptive_min_samples"]
+    scene.cycles.max_bounces = profile["max_bounces"]
+    scene.cycles.diffuse_bounces = profile["diffuse_bounces"]
+    scene.cycles.glossy_bounces = profile["glossy_bounces"]
+    scene.cycles.transmission_bounces = profile["transmission_bounces"]
+    scene.cycles.transparent_max_bounces = profile["transparent_max_bounces"]
+
+
+def set_renderer_settings(num_samples = 128, profile = "final"):
+    profile = render_args.profile if render_args.profile is not None else profile
+    record_scene_parameters("renderer", {"num_samples": num_samples, "profile": profile})
     bpy.data.scenes["Scene"].render.engine = "CYCLES"
-    bpy.data.scenes["Scene"].cycles.device = "GPU"
-    bpy.data.scenes["Scene"].cycles.samples = num_samples
+    apply_render_profile(profile)
+    if render_args.draft is not None:
+        bpy.data.scenes["Scene"].render.engine = {"EEVEE": "BLENDER_EEVEE", "WORKBENCH": "BLENDER_WORKBENCH"}[render_args.draft]
+        bpy.data.scenes["Scene"].render.resolution_percentage = 25
+        bpy.data.scenes["Scene"].eevee.taa_render_samples = 16
     bpy.data.scenes["Scene"].cycles.use_denoising = True
     bpy.data.scenes["Scene"].cycles.denoiser = "OPENIMAGEDENOISE"
     bpy.data.scenes["Scene"].cycles.use_preview_denoising = True
@@ -57,23 +722,30 @@ def set_renderer_settings(num_samples = 128):
     
 
 
-@partial(np.vectorize, signature = "()->()")
-def srgb_to_linear(color):
-    if color < 0.04045:
-        return color / 12.92 
-    else:
-        return ((color + 0.055) / 1.055)**2.4
+def srgb_to_linear(color, out = None):
+    color = np.asarray(color)
+    if not np.issubdtype(color.dtype, np.floating):
+        color = color.astype(np.float64)
+    linear = np.where(color < 0.04045, color / 12.92, ((np.maximum(color, 0.04045) + 0.055) / 1.055)**2.4)
+    if out is None:
+        return linear
+    out[...] = linear
+    return out
 
 
-@partial(np.vectorize, signature = "()->()")
-def linear_to_srgb(color):
-    if color < 0.0031308:
-        return 12.92 * color 
-    else:
-        return color**(1 / 2.4) * 1.055 - 0.055
+def linear_to_srgb(color, out = None):
+    color = np.asarray(color)
+    if not np.issubdtype(color.dtype, np.floating):
+        color = color.astype(np.float64)
+    srgb = np.where(color < 0.0031308, 12.92 * color, np.maximum(color, 0.0031308)**(1 / 2.4) * 1.055 - 0.055)
+    if out is None:
+        return srgb
+    out[...] = srgb
+    return out
         
 
 def import_bmesh(mesh_file):
+    record_scene_parameters("mesh", mesh_file)
     bpy.ops.import_scene.obj(filepath=mesh_file, split_mode = "OFF")
     obj = bpy.context.selected_objects[0]
     mesh = obj.data
@@ -97,34 +769,210 @@ def import_bmesh(mesh_file):
     return bm
 
 
-def import_color(bm, data_file = None, palette_file = None, color = None, bounds = None):
-    if color is None:
-        data = np.genfromtxt(data_file, delimiter=",")
-        if bounds is None:
-            min = data.min()
-            max = data.max()
-        else:
-            (min,max) = bounds
-        data_std = (data - min) / (max - min)
-        color_palette = np.genfromtxt(palette_file, delimiter=",")
+csv_cache = {}
+
+
+def cache_path(*parts):
+    path = os.path.join(directory, ".cache", *parts)
+    os.makedirs(os.path.dirname(path), exist_ok = True)
+    return path
+
+
+def file_hash(file_path):
+    hash = hashlib.sha1()
+    with open(file_path, "rb") as file:
+        for chunk in iter(partial(file.read, 1 << 20), b""):
+            hash.update(chunk)
+    return hash.hexdigest()
+
+
+def array_hash(*arrays):
+    hash = hashlib.sha1()
+    for array in arrays:
+        array = np.ascontiguousarray(array)
+        hash.update(array.dtype.str.encode())
+        hash.update(str(array.shape).encode())
+        hash.update(array.tobytes())
+    return hash.hexdigest()
+
+
+def mesh_arrays(mesh):
+    co = np.empty(len(mesh.vertices) * 3, dtype=np.float32)
+    mesh.vertices.foreach_get("co", co)
+    loop_totals = np.empty(len(mesh.polygons), dtype=np.int32)
+    mesh.polygons.foreach_get("loop_total", loop_totals)
+    loop_vertices = np.empty(len(mesh.loops), dtype=np.int32)
+    mesh.loops.foreach_get("vertex_index", loop_vertices)
+    
+    return (co.reshape(-1,3), loop_totals, loop_vertices)
+
+
+def mesh_from_arrays(name, co, loop_totals, loop_vertices):
+    mesh = bpy.data.meshes.new(name)
+    mesh.vertices.add(len(co))
+    mesh.vertices.foreach_set("co", np.ascontiguousarray(co, dtype=np.float32).ravel())
+    mesh.loops.add(len(loop_vertices))
+    mesh.loops.foreach_set("vertex_index", np.ascontiguousarray(loop_vertices, dtype=np.int32))
+    mesh.polygons.add(len(loop_totals))
+    mesh.polygons.foreach_set("loop_start", np.concatenate(([0], np.cumsum(loop_totals)[:-1])).astype(np.int32))
+    mesh.polygons.foreach_set("loop_total", np.ascontiguousarray(loop_totals, dtype=np.int32))
+    mesh.update(calc_edges = True)
+    
+    return mesh
+
+
+def load_csv(csv_file, dtype = np.float32):
+    csv_file = os.path.abspath(csv_file)
+    stat = os.stat(csv_file)
+    dtype = np.dtype(dtype)
+    key = (csv_file, stat.st_mtime_ns, stat.st_size, dtype.str)
+    if key in csv_cache:
+        return csv_cache[key]
+    
+    index_file = cache_path("csv", "index.json")
+    try:
+        with open(index_file) as file:
+            index = json.load(file)
+    except (OSError, ValueError):
+        index = {}
+    
+    entry = index.get(csv_file)
+    if entry is None or entry["mtime"] != stat.st_mtime_ns or entry["size"] != stat.st_size:
+        entry = {"mtime": stat.st_mtime_ns, "size": stat.st_size, "hash": file_hash(csv_file)}
+        index[csv_file] = entry
+        temp_file = "%s.%i" % (index_file, os.getpid())
+        with open(temp_file, "w") as file:
+            json.dump(index, file)
+        os.replace(temp_file, index_file)
+    
+    npy_file = cache_path("csv", "%s.%s.npy" % (entry["hash"], dtype.str.lstrip("<>|=")))
+    if not os.path.exists(npy_file):
+        data = np.genfromtxt(csv_file, delimiter=",", dtype=dtype)
+        temp_file = "%s.%i.npy" % (npy_file[:-4], os.getpid())
+        np.save(temp_file, data)
+        os.replace(temp_file, npy_file)
+    
+    data = np.load(npy_file, mmap_mode = "r")
+    csv_cache[key] = data
+    
+    return data
+
+
+colormap_cache = {}
+
+
+def load_colormap(palette_file, resolution = 4096):
+    key = (os.path.abspath(palette_file), resolution)
+    if key not in colormap_cache:
+        color_palette = load_csv(palette_file)
         if color_palette.shape[0] == 3:
             color_palette = np.vstack((color_palette, np.ones((1,color_palette.shape[1]))))
-        colors = np.vstack((
-            np.interp(data_std, np.linspace(0,1,256), color_palette[0,:]),
-            np.interp(data_std, np.linspace(0,1,256), color_palette[1,:]),
-            np.interp(data_std, np.linspace(0,1,256), color_palette[2,:]),
-            np.interp(data_std, np.linspace(0,1,256), color_palette[3,:]),
-        ))
+        palette_grid = np.linspace(0,1,color_palette.shape[1])
+        table_grid = np.linspace(0,1,resolution)
+        table = np.stack([np.interp(table_grid, palette_grid, channel) for channel in color_palette], axis=-1)
+        srgb_to_linear(table[:,:3], out = table[:,:3])
+        colormap_cache[key] = table.astype(np.float32)
+    
+    return colormap_cache[key]
+
+
+def apply_colormap(data, palette_file, bounds = None, scale = "linear", symmetric = False, reverse = False):
+    table = load_colormap(palette_file)
+    data = np.asarray(data, dtype=np.float32)
+    
+    if scale == "log1p":
+        data = np.log1p(data)
+        if bounds is not None:
+            bounds = np.log1p(bounds)
+    elif scale != "linear":
+        raise ValueError("Unknown colormap scale %s" % scale)
+    
+    if bounds is None:
+        if symmetric:
+            max = np.abs(data).max()
+            bounds = (-max, max)
+        else:
+            bounds = (data.min(), data.max())
+    (min,max) = bounds
+    if reverse:
+        (min,max) = (max,min)
+    
+    step = (len(table) - 1) / (max - min) if max != min else 0
+    index = np.clip((data - min) * step, 0, len(table) - 1)
+    
+    return table[np.rint(index).astype(np.intp)]
+
+
+def compute_colors(num_verts, data_file = None, palette_file = None, color = None, bounds = None, scale = "linear", symmetric = False):
+    if color is None:
+        colors = apply_colormap(load_csv(data_file), palette_file, bounds, scale, symmetric)
     else:
-        colors = np.repeat(np.array(color)[:,np.newaxis], len(bm.verts), axis=-1)
+        linear_color = np.append(srgb_to_linear(np.asarray(color[:3])), color[3:]).astype(np.float32)
+        colors = np.repeat(linear_color[np.newaxis,:], num_verts, axis=0)
     
-    if bm.loops.layers.color.active is not None:
-        bm.loops.layers.color.remove(bm.loops.layers.color.active)
+    return colors
+
+
+def set_vertex_colors(obj, colors, name = "color", domain = "POINT"):
+    mesh = obj.data
     
-    color_layer = bm.loops.layers.color.new("color")
-    for face in bm.faces:
-        for loop in face.loops:
-            loop[color_layer] = colors[:,loop.vert.index]
+    if domain == "CORNER":
+        loop_vertices = np.empty(len(mesh.loops), dtype=np.int32)
+        mesh.loops.foreach_get("vertex_index", loop_vertices)
+        
+        if name in mesh.vertex_colors.keys():
+            mesh.vertex_colors.remove(mesh.vertex_colors[name])
+        
+        srgb_colors = np.array(colors, dtype=np.float32)
+        linear_to_srgb(srgb_colors[:,:3], out = srgb_colors[:,:3])
+        color_layer = mesh.vertex_colors.new(name = name)
+        color_layer.data.foreach_set("color", np.ascontiguousarray(srgb_colors[loop_vertices], dtype=np.float32).ravel())
+    else:
+        for attribute_name in (name, name + "_alpha"):
+            if attribute_name in mesh.attributes.keys():
+                mesh.attributes.remove(mesh.attributes[attribute_name])
+        
+        color_attribute = mesh.attributes.new(name, "FLOAT_COLOR", domain)
+        color_attribute.data.foreach_set("color", np.ascontiguousarray(colors, dtype=np.float32).ravel())
+        if np.any(colors[:,3] != 1):
+            alpha_attribute = mesh.attributes.new(name + "_alpha", "FLOAT", domain)
+            alpha_attribute.data.foreach_set("value", np.ascontiguousarray(colors[:,3], dtype=np.float32))
+    
+    mesh.update()
+
+
+def import_color(target, data_file = None, palette_file = None, color = None, bounds = None, scale = "linear", symmetric = False, domain = "POINT"):
+    if isinstance(target, bpy.types.Object):
+        num_elements = len(target.data.polygons) if domain == "FACE" else len(target.data.vertices)
+        colors = compute_colors(num_elements, data_file, palette_file, color, bounds, scale, symmetric)
+        set_vertex_colors(target, colors, domain = domain)
+        return
+    
+    bm = target
+    colors = compute_colors(len(bm.verts), data_file, palette_file, color, bounds, scale, symmetric)
+    bm.verts.index_update()
+    
+    if domain == "CORNER":
+        if bm.loops.layers.color.active is not None:
+            bm.loops.layers.color.remove(bm.loops.layers.color.active)
+        
+        srgb_colors = np.array(colors, dtype=np.float32)
+        linear_to_srgb(srgb_colors[:,:3], out = srgb_colors[:,:3])
+        color_layer = bm.loops.layers.color.new("color")
+        for face in bm.faces:
+            for loop in face.loops:
+                loop[color_layer] = srgb_colors[loop.vert.index]
+    else:
+        if "color" in bm.verts.layers.float_vector.keys():
+            bm.verts.layers.float_vector.remove(bm.verts.layers.float_vector["color"])
+        if "color_alpha" in bm.verts.layers.float.keys():
+            bm.verts.layers.float.remove(bm.verts.layers.float["color_alpha"])
+        
+        color_layer = bm.verts.layers.float_vector.new("color")
+        alpha_layer = bm.verts.layers.float.new("color_alpha")
+        for vert in bm.verts:
+            vert[color_layer] = colors[vert.index,:3]
+            vert[alpha_layer] = colors[vert.index,3]
     
 
 def add_mesh(bm, name="Mesh"):
@@ -132,19 +980,37 @@ def add_mesh(bm, name="Mesh"):
     obj = bpy.data.objects.new(name, mesh)
     bpy.context.collection.objects.link(obj)
     bm.to_mesh(mesh)
+    
+    if render_args.draft is not None:
+        mod = obj.modifiers.new("Draft Decimate", "DECIMATE")
+        mod.ratio = 0.1
 
     return obj
     
 
-def add_vertex_colors(obj, shade_smooth = True):
+def add_vertex_colors(obj, shade_smooth = True, attribute = "color"):
     mat = bpy.data.materials.new(name = "Surface Color")
     mat.use_nodes = True
     
-    vertex_color_node = mat.node_tree.nodes.new("ShaderNodeVertexColor")
+    if attribute in obj.data.vertex_colors.keys():
+        color_node = mat.node_tree.nodes.new("ShaderNodeVertexColor")
+        color_node.layer_name = attribute
+        alpha_output = color_node.outputs["Alpha"]
+    else:
+        color_node = mat.node_tree.nodes.new("ShaderNodeAttribute")
+        color_node.attribute_name = attribute
+        alpha_output = None
+        if attribute + "_alpha" in obj.data.attributes.keys():
+            alpha_node = mat.node_tree.nodes.new("ShaderNodeAttribute")
+            alpha_node.name = "Alpha Attribute"
+            alpha_node.attribute_name = attribute + "_alpha"
+            alpha_output = alpha_node.outputs["Fac"]
+    color_node.name = "Color Attribute"
     shader_node = mat.node_tree.nodes["Principled BSDF"]
     
-    mat.node_tree.links.new(vertex_color_node.outputs["Color"], shader_node.inputs["Base Color"])
-    mat.node_tree.links.new(vertex_color_node.outputs["Alpha"], shader_node.inputs["Alpha"])
+    mat.node_tree.links.new(color_node.outputs["Color"], shader_node.inputs["Base Color"])
+    if alpha_output is not None:
+        mat.node_tree.links.new(alpha_output, shader_node.inputs["Alpha"])
     
     obj.data.materials.clear()
     obj.data.materials.append(mat)
@@ -156,41 +1022,50 @@ def add_vertex_colors(obj, shade_smooth = True):
     return mat
     
     
-def import_vector_field(vf_file):
-    vector_field = np.genfromtxt(vf_file, delimiter=",")
+def compute_vector_field_frames(vector_field):
+    arrows = vector_field[:,3:6]
+    if vector_field.shape[1] == 12:
+        return (arrows, vector_field[:,6:9], vector_field[:,9:12])
+    
+    lengths = np.linalg.norm(arrows, axis=-1)[:,np.newaxis]
+    nonzero = np.any(arrows != 0, axis=-1)[:,np.newaxis]
+    unit_arrows = arrows / np.where(nonzero, lengths, 1)
+    
+    along_x = np.all(np.isclose(unit_arrows, (1,0,0)), axis=-1) | np.all(np.isclose(unit_arrows, (-1,0,0)), axis=-1)
+    axes = np.where(along_x[:,np.newaxis], (0,0,1), (1,0,0))
+    normal_x = np.cross(unit_arrows, axes)
+    normal_z = np.cross(unit_arrows, normal_x)
+    
+    normal_x_lengths = np.linalg.norm(normal_x, axis=-1)[:,np.newaxis]
+    normal_z_lengths = np.linalg.norm(normal_z, axis=-1)[:,np.newaxis]
+    normal_x = np.where(nonzero, lengths * normal_x / np.where(nonzero, normal_x_lengths, 1), 0)
+    normal_z = np.where(nonzero, lengths * normal_z / np.where(nonzero, normal_z_lengths, 1), 0)
+    
+    return (arrows, normal_x, normal_z)
 
-    bm = bmesh.new()
-    arrow_layer = bm.verts.layers.float_vector.new("arrow")
-    normal_x_layer = bm.verts.layers.float_vector.new("normal_x")
-    normal_z_layer = bm.verts.layers.float_vector.new("normal_z")
-    for row in vector_field:
-        vert = bm.verts.new(row[0:3])
-        vert[arrow_layer] = row[3:6]
-        if row.size == 12:
-            vert[normal_x_layer] = row[6:9]
-            vert[normal_z_layer] = row[9:12]
-        else:
-            if np.all(row[3:6] == 0):
-                vert[normal_x_layer] = np.zeros(3)
-                vert[normal_z_layer] = np.zeros(3)
-            else:
-                length = np.linalg.norm(row[3:6])
-                arrow = row[3:6] / length
-                axis = np.array((0,0,1)) if np.allclose(arrow,np.array((1,0,0))) or np.allclose(arrow,np.array((-1,0,0))) else np.array((1,0,0))
-                normal_x = np.cross(arrow, axis)
-                unit_x = normal_x / np.linalg.norm(normal_x)
-                normal_z = np.cross(arrow, normal_x)
-                unit_z = normal_z / np.linalg.norm(normal_z)
-                vert[normal_x_layer] = length * unit_x
-                vert[normal_z_layer] = length * unit_z
 
-    return bm
+def import_vector_field(vf_file):
+    vector_field = np.atleast_2d(np.asarray(load_csv(vf_file), dtype=np.float64))
+    (arrows, normal_x, normal_z) = compute_vector_field_frames(vector_field)
+    
+    mesh = bpy.data.meshes.new("Vector Field")
+    mesh.vertices.add(vector_field.shape[0])
+    mesh.vertices.foreach_set("co", np.ascontiguousarray(vector_field[:,0:3], dtype=np.float32).ravel())
+    for (name, values) in [("arrow", arrows), ("normal_x", normal_x), ("normal_z", normal_z)]:
+        attribute = mesh.attributes.new(name, "FLOAT_VECTOR", "POINT")
+        attribute.data.foreach_set("vector", np.ascontiguousarray(values, dtype=np.float32).ravel())
+    mesh.update()
+
+    return mesh
 
 
-def add_vector_field(vec_bm, arr_obj, scale = 1):
-    vf_mesh = bpy.data.meshes.new("Vector Field")
+def add_vector_field(vf_data, arr_obj, scale = 1):
+    if isinstance(vf_data, bpy.types.Mesh):
+        vf_mesh = vf_data
+    else:
+        vf_mesh = bpy.data.meshes.new("Vector Field")
+        vf_data.to_mesh(vf_mesh)
     vf_obj = bpy.data.objects.new("Vector Field", vf_mesh)
-    vec_bm.to_mesh(vf_mesh)
     bpy.context.scene.collection.objects.link(vf_obj)
 
     mod = vf_obj.modifiers.new("Vector Field", "NODES")
@@ -249,6 +1124,7 @@ def add_vector_field(vec_bm, arr_obj, scale = 1):
 
 
 def create_vector_arrow(length = 10, ratio = 0.1, vertices = 25):
+    vertices = 9 if render_args.draft is not None else vertices
     bm = bmesh.new()
     prod = np.pi**2 * ratio**2 / length**2
     shift = (prod - 2 * np.sqrt(-prod * ratio**2 + prod + 4*ratio**2)) / (prod - 4)
@@ -295,14 +1171,9 @@ def create_vector_arrow(length = 10, ratio = 0.1, vertices = 25):
     return obj
 
 
-def create_dot(location = (0,0,0), radius = 1, color = (0,0,0,1)):
+def create_dot(location = (0,0,0), radius = 1, color = (0,0,0,1), domain = "POINT"):
     bm = bmesh.new()
-    bmesh.ops.create_icosphere(bm, subdivisions = 5, diameter = radius*2)
-
-    color_layer = bm.loops.layers.color.new("color")
-    for face in bm.faces:
-        for loop in face.loops:
-            loop[color_layer] = color
+    bmesh.ops.create_icosphere(bm, subdivisions = 2 if render_args.draft is not None else 5, diameter = radius*2)
             
     mesh = bpy.data.meshes.new("Dot")
     obj = bpy.data.objects.new("Dot", mesh)
@@ -310,6 +1181,8 @@ def create_dot(location = (0,0,0), radius = 1, color = (0,0,0,1)):
     
     bm.to_mesh(mesh)
     bm.free()
+    
+    set_vertex_colors(obj, compute_colors(len(mesh.vertices), color = color), domain = domain)
             
     obj.data.polygons.foreach_set("use_smooth",  [True] * len(obj.data.polygons))
     obj.data.update()
@@ -536,6 +1409,7 @@ def set_object_collections(object = [], backdrop = [], instancing = []):
 
 
 def setup_compositor(mask_center = (0.5,0.15), mask_size = (0.95,0.2), mask_blur_size = 32, shadow_color_correction_exponent = 1):
+    record_scene_parameters("compositor", dict(locals()))
     scene = bpy.context.scene
     scene.use_nodes = True
     
@@ -544,6 +1418,7 @@ def setup_compositor(mask_center = (0.5,0.15), mask_size = (0.95,0.2), mask_blur
     shadow_layer = scene.node_tree.nodes.new("CompositorNodeRLayers")
     shadow_layer.layer = "Shadow Layer"
     background_layer = scene.node_tree.nodes.new("CompositorNodeRLayers")
+    background_layer.name = "Background Layer"
     background_layer.layer = "Background Layer"
     
     ratio_node = scene.node_tree.nodes.new("CompositorNodeMixRGB")
@@ -681,6 +1556,7 @@ def set_resolution(height, crop = None):
     
 
 def setup_camera(offset = (0,0,0), distance = 1, angle = (0,0,0), lens = 85, height = 640, crop = None):
+    record_scene_parameters("camera", dict(locals()))
     cam_data = bpy.data.cameras.new(name="Camera")
     cam_obj = bpy.data.objects.new("Camera", cam_data)
     cam_axis = bpy.data.objects.new(name = "Camera Axis", object_data = None)
@@ -704,6 +1580,7 @@ def setup_lighting(offset = (0,0,0), shifts = (-1,-1,1), energies = (1,1,1), siz
                    vertical_angles = (-np.pi/4, -np.pi/4, np.pi/4),
                    types = ("AREA","AREA","POINT"),
                    names = ("Key","Fill","Rim")):
+    record_scene_parameters("lighting", dict(locals()))
     bpy.data.scenes["Scene"].render.film_transparent = True
     bpy.data.worlds["World"].node_tree.nodes["Background"].inputs["Strength"].default_value = 0
     
@@ -6,44 +6,15 @@ import os
 from mathutils import Vector
 
 
-def add_face_colors(obj, data_file, palette_file, bounds = None):
-    data = np.genfromtxt(data_file, delimiter=",")
-    if bounds is None:
-        min = data.min()
-        max = data.max()
-    else:
-        (min,max) = bounds
-    data_std = (data - min) / (max - min)
-    color_palette = np.genfromtxt(palette_file, delimiter=",")
-    if color_palette.shape[0] == 3:
-        color_palette = np.vstack((color_palette, np.ones((1,color_palette.shape[1]))))
-    colors = np.vstack((
-        np.interp(data_std, np.linspace(0,1,256), color_palette[0,:]),
-        np.interp(data_std, np.linspace(0,1,256), color_palette[1,:]),
-        np.interp(data_std, np.linspace(0,1,256), color_palette[2,:]),
-        np.interp(data_std, np.linspace(0,1,256), color_palette[3,:]),
-    ))
-    
-    obj.data.materials.clear()
-    for (idx,color) in enumerate(colors.T):
-        mat = bpy.data.materials.new(name = "Face Color %i" % idx)
-        mat.use_nodes = True
-        mat.node_tree.nodes["Principled BSDF"].inputs["Base Color"].default_value = srgb_to_linear(color)
-        mat.node_tree.nodes["Principled BSDF"].inputs["Roughness"].default_value = 1
-        obj.data.materials.append(mat)
-    
-    for (idx,polygon) in enumerate(obj.data.polygons):
-        polygon.material_index = idx
-        polygon.use_smooth = True
-        
+def add_wireframe(figure):
     mat = bpy.data.materials.new(name = "Wireframe Color")
     mat.use_nodes = True
     mat.node_tree.nodes["Principled BSDF"].inputs["Base Color"].default_value = (0,0,0,1)
-    obj.data.materials.append(mat)
+    figure["object"].data.materials.append(mat)
     
-    mod = obj.modifiers.new("Wireframe", "WIREFRAME")
+    mod = figure["object"].modifiers.new("Wireframe", "WIREFRAME")
     mod.use_replace = False
-    mod.material_offset = len(obj.data.polygons)
+    mod.material_offset = 1
     mod.thickness = 0.005
 
 
@@ -66,7 +37,7 @@ def create_elliptical_torus(line_thickness = 0.25, vertical_thickness = 1):
     
 def add_texture(mat,texture_file_path):
     shader_node = mat.node_tree.nodes["Principled BSDF"]
-    vertex_color_node = mat.node_tree.nodes["Vertex Color"]
+    vertex_color_node = mat.node_tree.nodes["Color Attribute"]
     texture_node = mat.node_tree.nodes.new("ShaderNodeTexImage")
     texture_node.image = bpy.data.images.load(texture_file_path)
     mix_node = mat.node_tree.nodes.new("ShaderNodeMixRGB")
@@ -83,235 +54,146 @@ def transform_uv_to_mercator(obj):
         obj.data.uv_layers.active.data[loop.index].uv[0] = -obj.data.uv_layers.active.data[loop.index].uv[0] + 1.5
     
 
+def add_mercator_texture(figure):
+    add_texture(figure["material"], os.path.join(directory, "mgp", "mercator.png"))
+    transform_uv_to_mercator(figure["object"])
+
+
+def add_kernel_location(figure):
+    obj = figure["object"]
+    sph_obj = create_dot(location = (0,-1.01 * np.sin(obj.rotation_euler[0]),1.01 * np.cos(obj.rotation_euler[0])), radius = 0.025, color = (0,0,0,1))
+    add_vertex_colors(sph_obj)
+    set_object_collections(object = [sph_obj])
+
+
+def add_observations(obs_file, cc_file, figure):
+    add_mercator_texture(figure)
+    obs_mesh = import_vector_field(os.path.join(directory, "mgp", obs_file))
+    cc_mesh = import_vector_field(os.path.join(directory, "mgp", cc_file))
+    obs_obj = add_vector_field(obs_mesh, arr_obj, scale = 0.00375)
+    ell_obj = create_elliptical_torus(line_thickness = 0.2, vertical_thickness = 1)
+    cc_obj = add_vector_field(cc_mesh, ell_obj, scale = 0.01)
+    set_object_collections(object = [cc_obj], instancing = [ell_obj])
+    for vf_obj in [obs_obj, cc_obj]:
+        vf_obj.scale = figure["object"].scale
+        vf_obj.rotation_euler = figure["object"].rotation_euler
+    figure["arrow_material"] = arr_obj.data.materials[0]
+    vf_mat = bpy.data.materials.new(name = "Gray Surface")
+    vf_mat.use_nodes = True
+    vf_mat.node_tree.nodes["Principled BSDF"].inputs["Base Color"].default_value = srgb_to_linear((0.5,0.5,0.5,1))
+    obs_obj.modifiers["Vector Field"].node_group.nodes["Attribute Combine XYZ"].input_type_x = "FLOAT"
+    obs_obj.modifiers["Vector Field"].node_group.nodes["Attribute Combine XYZ"].inputs[2].default_value = 3.5
+    obs_obj.modifiers["Vector Field"].node_group.nodes["Attribute Combine XYZ"].input_type_z = "FLOAT"
+    obs_obj.modifiers["Vector Field"].node_group.nodes["Attribute Combine XYZ"].inputs[6].default_value = 3.5
+    arr_obj.data.materials.clear()
+    arr_obj.data.materials.append(vf_mat)
+
+
+def remove_observations(figure):
+    arr_obj.data.materials.clear()
+    arr_obj.data.materials.append(figure["arrow_material"])
+
+
+def move_camera_closer(figure):
+    mask_node = bpy.data.scenes["Scene"].node_tree.nodes["Ellipse Mask"]
+    figure["camera"] = (np.array(cam_obj.location), np.array(cam_axis.rotation_euler), mask_node.y, mask_node.height)
+    cam_obj.location = (0, -9.25, 0)
+    cam_axis.rotation_euler = (-5*np.pi/36, 0, 0)
+    mask_node.y = 0.3375
+    mask_node.height = 0.3875
+
+
+def restore_camera(figure):
+    mask_node = bpy.data.scenes["Scene"].node_tree.nodes["Ellipse Mask"]
+    (cam_obj.location, cam_axis.rotation_euler, mask_node.y, mask_node.height) = figure["camera"]
+
+
+def add_vector_field_pair(vf_file, palette_file, figure):
+    color = apply_colormap(192/255, os.path.join(directory, "col", palette_file), bounds = (0,1))
+    figure["arrow_shader"] = arr_obj.data.materials["Black Surface"].node_tree.nodes["Principled BSDF"]
+    replacement_shader_node = arr_obj.data.materials["Black Surface"].node_tree.nodes.new("ShaderNodeBsdfPrincipled")
+    replacement_shader_node.inputs["Base Color"].default_value = color
+    arr_obj.data.materials["Black Surface"].node_tree.links.new(replacement_shader_node.outputs["BSDF"], arr_obj.data.materials[0].node_tree.nodes["Material Output"].inputs["Surface"])
+    figure["replacement_arrow_shader"] = replacement_shader_node
+    sph_obj = create_dot()
+    sph_obj.data.materials.clear()
+    sph_obj.data.materials.append(arr_obj.data.materials["Black Surface"])
+    vf_sph_obj = add_vector_field(import_vector_field(os.path.join(directory, "mgp", vf_file)), sph_obj, scale = 0.04)
+    set_object_collections(object = [vf_sph_obj], instancing = [sph_obj])
+
+
+def remove_vector_field_pair(figure):
+    arr_obj.data.materials[0].node_tree.nodes.remove(figure["replacement_arrow_shader"])
+    arr_obj.data.materials["Black Surface"].node_tree.links.new(figure["arrow_shader"].outputs["BSDF"], arr_obj.data.materials[0].node_tree.nodes["Material Output"].inputs["Surface"])
+    
+
 directory = os.getcwd()
 with open(os.path.join(directory,"render.py")) as file:
     exec(file.read())
 
-reset_scene()
+def build_scene():
+    reset_scene()
+    setup_layers()
+    setup_compositor(mask_center = (0.5,0.3125), mask_size = (0.675,0.325), shadow_color_correction_exponent = 2.75)
+    setup_camera(distance = 9.125, angle = (-np.pi/16, 0, 0), lens = 85, height = 2560, crop = (1/5,9/10,0,10/11))
+    setup_lighting(shifts = (-10,-10,10), sizes = (9,18,15), energies = (1500,150,1125),
+                   horizontal_angles = (-np.pi/6, np.pi/3, np.pi/3), vertical_angles = (-np.pi/3, -np.pi/6, np.pi/4))
+    bd_obj = create_backdrop(location = (0, 0, -1), scale = (5,5,5))
+    arr_obj = create_vector_arrow()
+    set_object_collections(backdrop = [bd_obj], instancing = [arr_obj])
+
+load_scene_template("s2", build_scene)
 set_renderer_settings(num_samples = 2048 if bpy.app.background else 128)
-setup_layers()
-setup_compositor(mask_center = (0.5,0.3125), mask_size = (0.675,0.325), shadow_color_correction_exponent = 2.75)
-(cam_axis, cam_obj) = setup_camera(distance = 9.125, angle = (-np.pi/16, 0, 0), lens = 85, height = 2560, crop = (1/5,9/10,0,10/11))
-setup_lighting(shifts = (-10,-10,10), sizes = (9,18,15), energies = (1500,150,1125),
-               horizontal_angles = (-np.pi/6, np.pi/3, np.pi/3), vertical_angles = (-np.pi/3, -np.pi/6, np.pi/4))
-bm = import_bmesh(os.path.join(directory, "mgp", "s2.obj"))
-bd_obj = create_backdrop(location = (0, 0, -1), scale = (5,5,5))
-arr_obj = create_vector_arrow()
-set_object_collections(backdrop = [bd_obj], instancing = [arr_obj])
+(cam_axis, cam_obj, arr_obj) = (bpy.data.objects["Camera Axis"], bpy.data.objects["Camera"], bpy.data.objects["Arrow"])
 
 
-if bpy.app.background:
-    for file in ["s2_sv1.csv","s2_sv2.csv","s2_sv3.csv","s2_ev.csv","s2_pr.csv"]:
-        import_color(bm, color = (31/255, 119/255, 180/255, 1))
-        obj = add_mesh(bm)
-        mat = add_vertex_colors(obj)
-        vf_bm = import_vector_field(os.path.join(directory, "mgp", file))
-        vf_obj = add_vector_field(vf_bm, arr_obj, scale = 3)
-        set_object_collections(object = [obj, vf_obj])
-        bpy.context.scene.render.filepath = os.path.join(directory, "output", file.replace(".csv",".png"))
-        set_resolution(480)
-        bpy.ops.render.render(use_viewport = True, write_still = True)
-        cleanup(objects = [obj,vf_obj], materials = [mat], modifiers = vf_obj.modifiers)
-        
-        
-    for file in ["s2_xy.csv"]:
-        import_color(bm, color = (31/255, 119/255, 180/255, 1))
-        obj = add_mesh(bm)
-        mat = add_vertex_colors(obj)
-        vf_bm = import_vector_field(os.path.join(directory, "mgp", file))
-        vf_obj = add_vector_field(vf_bm, arr_obj, scale = 3)
-        set_object_collections(object = [obj, vf_obj])
-        bpy.context.scene.render.filepath = os.path.join(directory, "output", file.replace(".csv",".png"))
-        set_resolution(520)
-        bpy.ops.render.render(use_viewport = True, write_still = True)
-        cleanup(objects = [obj,vf_obj], materials = [mat], modifiers = vf_obj.modifiers)
-        
-        
-    for files in [("s2_pm.csv","s2_ps.csv")]:
-        import_color(bm, data_file = os.path.join(directory, "mgp", files[1]), palette_file = os.path.join(directory, "col", "viridis.csv"))
-        obj = add_mesh(bm)
-        mat = add_vertex_colors(obj)
-        add_texture(mat, os.path.join(directory, "mgp", "mercator.png"))
-        transform_uv_to_mercator(obj)
-        vf_bm = import_vector_field(os.path.join(directory, "mgp", files[0]))
-        vf_obj = add_vector_field(vf_bm, arr_obj, scale = 0.00375)
-        set_object_collections(object = [obj, vf_obj])
-        obj.scale = (1,-1,1)
-        vf_obj.scale = (1,-1,1)
-        obj.rotation_euler = (np.pi, np.pi/12, np.pi/2)
-        vf_obj.rotation_euler = (np.pi, np.pi/12, np.pi/2)
-        bpy.context.scene.render.filepath = os.path.join(directory, "output", files[0].replace(".csv",".png"))
-        set_resolution(560)
-        bpy.ops.render.render(use_viewport = True, write_still = True)
-        cleanup(objects = [obj,vf_obj], materials = [mat], modifiers = vf_obj.modifiers)
-        
-        
-    for files in [("s2_obs.csv","s2_pcc.csv","s2_ps.csv")]:
-        import_color(bm, data_file = os.path.join(directory, "mgp", files[2]), palette_file = os.path.join(directory, "col", "viridis.csv"))
-        obj = add_mesh(bm)
-        mat = add_vertex_colors(obj)
-        add_texture(mat, os.path.join(directory, "mgp", "mercator.png"))
-        transform_uv_to_mercator(obj)
-        obs_bm = import_vector_field(os.path.join(directory, "mgp", files[0]))
-        cc_bm = import_vector_field(os.path.join(directory, "mgp", files[1]))
-        obs_obj = add_vector_field(obs_bm, arr_obj, scale = 0.00375)
-        ell_obj = create_elliptical_torus(line_thickness = 0.2, vertical_thickness = 1)
-        cc_obj = add_vector_field(cc_bm, ell_obj, scale = 0.01)
-        set_object_collections(object = [obj, cc_obj], instancing = [ell_obj])
-        obj.scale = (1,-1,1)
-        obs_obj.scale = (1,-1,1)
-        cc_obj.scale = (1,-1,1)
-        obj.rotation_euler = (np.pi, np.pi/12, np.pi/2)
-        obs_obj.rotation_euler = (np.pi, np.pi/12, np.pi/2)
-        cc_obj.rotation_euler = (np.pi, np.pi/12, np.pi/2)
-        vf_mat_orig = arr_obj.data.materials[0]
-        vf_mat = bpy.data.materials.new(name = "Gray Surface")
-        vf_mat.use_nodes = True
-        vf_mat.node_tree.nodes["Principled BSDF"].inputs["Base Color"].default_value = srgb_to_linear((0.5,0.5,0.5,1))
-        obs_obj.modifiers["Vector Field"].node_group.nodes["Attribute Combine XYZ"].input_type_x = "FLOAT"
-        obs_obj.modifiers["Vector Field"].node_group.nodes["Attribute Combine XYZ"].inputs[2].default_value = 3.5
-        obs_obj.modifiers["Vector Field"].node_group.nodes["Attribute Combine XYZ"].input_type_z = "FLOAT"
-        obs_obj.modifiers["Vector Field"].node_group.nodes["Attribute Combine XYZ"].inputs[6].default_value = 3.5
-        arr_obj.data.materials.clear()
-        arr_obj.data.materials.append(vf_mat)
-        bpy.context.scene.render.filepath = os.path.join(directory, "output", files[1].replace(".csv",".png"))
-        set_resolution(560)
-        bpy.ops.render.render(use_viewport = True, write_still = True)
-        arr_obj.data.materials.clear()
-        arr_obj.data.materials.append(vf_mat_orig)
-        cleanup(objects = [obj,ell_obj,obs_obj,cc_obj], materials = [mat,vf_mat], modifiers = [obs_obj.modifiers["Vector Field"], cc_obj.modifiers["Vector Field"]])
-        
-        
-    for file in ["s2_ker.csv"]:
-        import_color(bm, data_file = os.path.join(directory, "mgp", file), palette_file = os.path.join(directory, "col", "viridis.csv"))
-        obj = add_mesh(bm)
-        mat = add_vertex_colors(obj)
-        obj.rotation_euler[0] = np.pi / 6
-        sph_obj = create_dot(location = (0,-1.01 * np.sin(obj.rotation_euler[0]),1.01 * np.cos(obj.rotation_euler[0])), radius = 0.025, color = (0,0,0,1))
-        sph_mat = add_vertex_colors(sph_obj)
-        set_object_collections(object = [obj, sph_obj])
-        bpy.context.scene.render.filepath = os.path.join(directory, "output", file.replace(".csv",".png"))
-        set_resolution(480)
-        bpy.ops.render.render(use_viewport = True, write_still = True)
-        cleanup(objects = [obj,sph_obj], materials = [mat,sph_mat])
-        
+s2_mesh_file = os.path.join(directory, "mgp", "s2.obj")
+viridis_file = os.path.join(directory, "col", "viridis.csv")
+plasma_file = os.path.join(directory, "col", "plasma.csv")
+blue = (31/255, 119/255, 180/255, 1)
 
-    for file in ["s2_ker.csv"]:
-        import_color(bm, data_file = os.path.join(directory, "mgp", file), palette_file = os.path.join(directory, "col", "viridis.csv"))
-        obj = add_mesh(bm)
-        mat = add_vertex_colors(obj)
-        mat.node_tree.nodes["Principled BSDF"].inputs["Roughness"].default_value = 1
-        obj.rotation_euler[0] = np.pi / 6
-        set_object_collections(object = [obj])
-        bpy.context.scene.render.filepath = os.path.join(directory, "output", file.replace("ker.csv","lim.png"))
-        set_resolution(375)
-        bpy.ops.render.render(use_viewport = True, write_still = True)
-        cleanup(objects = [obj], materials = [mat])
-        
-        
-    for file in ["ico1_ker.csv", "ico2_ker.csv", "ico3_ker.csv"]:
-        ico_bm = import_bmesh(os.path.join(directory, "ggp", file.replace("_ker.csv",".obj")))
-        obj = add_mesh(ico_bm)
-        add_face_colors(obj, data_file = os.path.join(directory, "ggp", file), palette_file = os.path.join(directory, "col", "viridis.csv"))
-        obj.rotation_euler[0] = np.pi / 6
-        set_object_collections(object = [obj])
-        bpy.context.scene.render.filepath = os.path.join(directory, "output", file.replace(".csv",".png"))
-        set_resolution(375)
-        bpy.ops.render.render(use_viewport = True, write_still = True)
-        cleanup(objects = [obj], materials = obj.data.materials, modifiers = obj.modifiers)
-        
-        
-    for file in ["s2_ex.csv","s2_ey.csv","s2_ez.csv"]:
-        import_color(bm, data_file = os.path.join(directory, "mgp", file), palette_file = os.path.join(directory, "col", "viridis.csv"))
-        obj = add_mesh(bm)
-        mat = add_vertex_colors(obj)
-        set_object_collections(object = [obj])
-        set_resolution(230)
-        bpy.context.scene.render.filepath = os.path.join(directory, "output", file.replace(".csv",".png"))
-        bpy.ops.render.render(use_viewport = True, write_still = True)
-        cleanup(objects = [obj], materials = [mat])
-        
-        
-    for color in [(31/255, 119/255, 180/255, 1)]:
-        import_color(bm, color = color)
-        obj = add_mesh(bm)
-        mat = add_vertex_colors(obj)
-        set_object_collections(object = [obj])
-        orig_camera_location = np.array(cam_obj.location)
-        orig_camera_angle = np.array(cam_axis.rotation_euler)
-        cam_obj.location = (0, -9.25, 0)
-        cam_axis.rotation_euler = (-5*np.pi/36, 0, 0)
-        orig_mask_y = bpy.data.scenes["Scene"].node_tree.nodes["Ellipse Mask"].y
-        orig_mask_height = bpy.data.scenes["Scene"].node_tree.nodes["Ellipse Mask"].height
-        bpy.data.scenes["Scene"].node_tree.nodes["Ellipse Mask"].y = 0.3375
-        bpy.data.scenes["Scene"].node_tree.nodes["Ellipse Mask"].height = 0.3875
-        bpy.context.scene.render.filepath = os.path.join(directory, "output", "s2.png")
-        set_resolution(480)
-        bpy.ops.render.render(use_viewport = True, write_still = True)
-        cam_obj.location = orig_camera_location
-        cam_axis.rotation_euler = orig_camera_angle
-        bpy.data.scenes["Scene"].node_tree.nodes["Ellipse Mask"].y = orig_mask_y
-        bpy.data.scenes["Scene"].node_tree.nodes["Ellipse Mask"].height = orig_mask_height
-        cleanup(objects = [obj], materials = [mat])
-    
 
-    for file in ["s2_a.csv","s2_b.csv"]:
-        import_color(bm, data_file = os.path.join(directory, "mgp", file), palette_file = os.path.join(directory, "col", "viridis.csv"))
-        obj = add_mesh(bm)
-        mat = add_vertex_colors(obj)
-        set_object_collections(object = [obj])
-        set_resolution(245)
-        bpy.context.scene.render.filepath = os.path.join(directory, "output", file.replace(".csv",".png"))
-        bpy.ops.render.render(use_viewport = True, write_still = True)
-        cleanup(objects = [obj], materials = [mat])
-     
-    
-    for file in ["s2_x.csv","s2_y.csv"]:
-        import_color(bm, data_file = os.path.join(directory, "mgp", file), palette_file = os.path.join(directory, "col", "plasma.csv"))
-        obj = add_mesh(bm)
-        mat = add_vertex_colors(obj)
-        set_object_collections(object = [obj])
-        set_resolution(245)
-        bpy.context.scene.render.filepath = os.path.join(directory, "output", file.replace(".csv",".png"))
-        bpy.ops.render.render(use_viewport = True, write_still = True)
-        cleanup(objects = [obj], materials = [mat])
-        
-        
-    for (files,palette_file) in [(("s2_va.csv","s2_vb.csv"),"viridis.csv"),(("s2_vx.csv","s2_vy.csv"),"plasma.csv")]:
-        import_color(bm, color = (31/255, 119/255, 180/255, 1))
-        obj = add_mesh(bm)
-        mat = add_vertex_colors(obj)
-        color_palette = np.genfromtxt(os.path.join(directory, "col", palette_file), delimiter=",")
-        color = srgb_to_linear(color_palette[:,3*color_palette.shape[1]//4])
-        original_shader_node = arr_obj.data.materials["Black Surface"].node_tree.nodes["Principled BSDF"]
-        replacement_shader_node = arr_obj.data.materials["Black Surface"].node_tree.nodes.new("ShaderNodeBsdfPrincipled")
-        replacement_shader_node.inputs["Base Color"].default_value = np.append(color,1)
-        arr_obj.data.materials["Black Surface"].node_tree.links.new(replacement_shader_node.outputs["BSDF"], arr_obj.data.materials[0].node_tree.nodes["Material Output"].inputs["Surface"])
-        vf_x_bm = import_vector_field(os.path.join(directory, "mgp", files[0]))
-        vf_x_obj = add_vector_field(vf_x_bm, arr_obj, scale = 0.05)
-        vf_y_bm = import_vector_field(os.path.join(directory, "mgp", files[1]))
-        vf_y_obj = add_vector_field(vf_y_bm, arr_obj, scale = 0.05)
-        sph_obj = create_dot()
-        sph_obj.data.materials.clear()
-        sph_obj.data.materials.append(arr_obj.data.materials["Black Surface"])
-        vf_sph_obj = add_vector_field(vf_x_bm, sph_obj, scale = 0.04)
-        set_object_collections(object = [obj, vf_x_obj,vf_y_obj,vf_sph_obj], instancing=[sph_obj])
-        set_resolution(245)
-        bpy.context.scene.render.filepath = os.path.join(directory, "output", files[0].replace(".csv",files[1].replace("s2_v","")).replace(".csv",".png"))
-        bpy.ops.render.render(use_viewport = True, write_still = True)
-        arr_obj.data.materials[0].node_tree.nodes.remove(replacement_shader_node)
-        arr_obj.data.materials["Black Surface"].node_tree.links.new(original_shader_node.outputs["BSDF"], arr_obj.data.materials[0].node_tree.nodes["Material Output"].inputs["Surface"])
-        cleanup(objects = [obj,vf_x_obj,vf_y_obj,sph_obj,vf_sph_obj], materials = [mat], modifiers = [vf_x_obj.modifiers["Vector Field"],vf_y_obj.modifiers["Vector Field"],vf_sph_obj.modifiers["Vector Field"]])
-    
-    
-    for file in ["s2_e11.csv","s2_e109.csv"]:
-        import_color(bm, data_file = os.path.join(directory, "mgp", file), palette_file = os.path.join(directory, "col", "viridis.csv"))
-        obj = add_mesh(bm)
-        mat = add_vertex_colors(obj)
-        obj.rotation_euler[0] = -np.pi / 4
-        set_object_collections(object = [obj])
-        bpy.context.scene.render.filepath = os.path.join(directory, "output", file.replace(".csv",".png"))
-        set_resolution(320)
-        bpy.ops.render.render(use_viewport = True, write_still = True)
-        cleanup(objects = [obj], materials = [mat])
-        
+specs = []
+specs += [{"output": file.replace(".csv",".png"), "mesh_file": s2_mesh_file, "color": blue, 
+           "vector_fields": [(os.path.join(directory, "mgp", file), arr_obj, 3)], "resolution": 480}
+          for file in ["s2_sv1.csv","s2_sv2.csv","s2_sv3.csv","s2_ev.csv","s2_pr.csv"]]
+specs += [{"output": file.replace(".csv",".png"), "mesh_file": s2_mesh_file, "color": blue, 
+           "vector_fields": [(os.path.join(directory, "mgp", file), arr_obj, 3)], "resolution": 520}
+          for file in ["s2_xy.csv"]]
+specs += [{"output": files[0].replace(".csv",".png"), "mesh_file": s2_mesh_file, "data_file": os.path.join(directory, "mgp", files[1]), "palette_file": viridis_file, 
+           "vector_fields": [(os.path.join(directory, "mgp", files[0]), arr_obj, 0.00375)], "scale": (1,-1,1), "rotation": (np.pi, np.pi/12, np.pi/2), 
+           "setup": add_mercator_texture, "inputs": [os.path.join(directory, "mgp", "mercator.png")], "resolution": 560}
+          for files in [("s2_pm.csv","s2_ps.csv")]]
+specs += [{"output": files[1].replace(".csv",".png"), "mesh_file": s2_mesh_file, "data_file": os.path.join(directory, "mgp", files[2]), "palette_file": viridis_file, 
+           "scale": (1,-1,1), "rotation": (np.pi, np.pi/12, np.pi/2), 
+           "setup": partial(add_observations, files[0], files[1]), "teardown": remove_observations, 
+           "inputs": [os.path.join(directory, "mgp", "mercator.png"), os.path.join(directory, "mgp", files[0]), os.path.join(directory, "mgp", files[1])], "resolution": 560}
+          for files in [("s2_obs.csv","s2_pcc.csv","s2_ps.csv")]]
+specs += [{"output": file.replace(".csv",".png"), "mesh_file": s2_mesh_file, "data_file": os.path.join(directory, "mgp", file), "palette_file": viridis_file, 
+           "rotation": (np.pi / 6, 0, 0), "setup": add_kernel_location, "resolution": 480}
+          for file in ["s2_ker.csv"]]
+specs += [{"output": file.replace("ker.csv","lim.png"), "mesh_file": s2_mesh_file, "data_file": os.path.join(directory, "mgp", file), "palette_file": viridis_file, 
+           "roughness": 1, "rotation": (np.pi / 6, 0, 0), "resolution": 375}
+          for file in ["s2_ker.csv"]]
+specs += [{"output": file.replace(".csv",".png"), "mesh_file": os.path.join(directory, "ggp", file.replace("_ker.csv",".obj")), 
+           "data_file": os.path.join(directory, "ggp", file), "palette_file": viridis_file, "domain": "FACE", 
+           "roughness": 1, "rotation": (np.pi / 6, 0, 0), "setup": add_wireframe, "resolution": 375}
+          for file in ["ico1_ker.csv", "ico2_ker.csv", "ico3_ker.csv"]]
+specs += [{"output": file.replace(".csv",".png"), "mesh_file": s2_mesh_file, "data_file": os.path.join(directory, "mgp", file), "palette_file": viridis_file, "resolution": 230}
+          for file in ["s2_ex.csv","s2_ey.csv","s2_ez.csv"]]
+specs += [{"output": "s2.png", "mesh_file": s2_mesh_file, "color": color, "setup": move_camera_closer, "teardown": restore_camera, "resolution": 480}
+          for color in [blue]]
+specs += [{"output": file.replace(".csv",".png"), "mesh_file": s2_mesh_file, "data_file": os.path.join(directory, "mgp", file), "palette_file": palette_file, "resolution": 245}
+          for (file,palette_file) in [("s2_a.csv",viridis_file),("s2_b.csv",viridis_file),("s2_x.csv",plasma_file),("s2_y.csv",plasma_file)]]
+specs += [{"output": files[0].replace(".csv",files[1].replace("s2_v","")).replace(".csv",".png"), "mesh_file": s2_mesh_file, "color": blue, 
+           "vector_fields": [(os.path.join(directory, "mgp", files[0]), arr_obj, 0.05), (os.path.join(directory, "mgp", files[1]), arr_obj, 0.05)], 
+           "setup": partial(add_vector_field_pair, files[0], palette_file), "teardown": remove_vector_field_pair, 
+           "inputs": [os.path.join(directory, "col", palette_file)], "resolution": 245}
+          for (files,palette_file) in [(("s2_va.csv","s2_vb.csv"),"viridis.csv"),(("s2_vx.csv","s2_vy.csv"),"plasma.csv")]]
+specs += [{"output": file.replace(".csv",".png"), "mesh_file": s2_mesh_file, "data_file": os.path.join(directory, "mgp", file), "palette_file": viridis_file, 
+           "rotation": (-np.pi / 4, 0, 0), "resolution": 320}
+          for file in ["s2_e11.csv","s2_e109.csv"]]
+
+
+if bpy.app.background:
+    execute_figures(specs)
@@ -0,0 +1,9 @@
+import bpy
+import os
+
+
+directory = os.getcwd()
+with open(os.path.join(directory,"render.py")) as file:
+    exec(file.read())
+
+write_contact_sheet()
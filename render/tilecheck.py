@@ -0,0 +1,44 @@
+import bpy
+import bmesh
+from functools import partial
+import numpy as np
+import os
+import sys
+from mathutils import Vector
+
+
+
+
+directory = os.getcwd()
+with open(os.path.join(directory,"render.py")) as file:
+    exec(file.read())
+
+reset_scene()
+set_renderer_settings(num_samples = 16)
+setup_camera(offset = (0,0,0), distance = 10, angle = (-np.pi/8,0,0), height = 120, crop = (1/6,5/6,1/6,5/6))
+setup_lighting(shifts = (-5,-5,5), energies = (150,125,100))
+dot_obj = create_dot(radius = 2, color = (31/255,119/255,180/255,1))
+add_vertex_colors(dot_obj)
+
+
+num_tiles = 3
+render_args.force = True
+render_args.tiles = num_tiles
+for index in range(num_tiles):
+    render_args.tile = index
+    render_figure("tilecheck_tiled.png")
+render_args.stitch = True
+render_figure("tilecheck_tiled.png")
+
+render_args.tiles = 1
+render_args.stitch = False
+render_figure("tilecheck_full.png")
+
+tiled = load_pixels(os.path.join(directory, "output", "tilecheck_tiled.png"))
+full = load_pixels(os.path.join(directory, "output", "tilecheck_full.png"))
+if tiled.shape != full.shape:
+    sys.exit("tilecheck: stitched size %s does not match untiled size %s" % (tiled.shape[:2], full.shape[:2]))
+error = np.abs(tiled - full).mean()
+print("tilecheck: %i tiles, %ix%i pixels, mean difference %.5f" % (num_tiles, full.shape[1], full.shape[0], error))
+if error > 2/255:
+    sys.exit("tilecheck: stitched render differs from untiled render")